@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measure the memory of Opt objects and the time to register them, and to
+register them again, which runs the duplicate detection of every opt.
+
+    python -m benchmarks.bench_opts [count ...]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from src.config import options
+
+COUNTS = (10000, 100000, 1000000)
+
+
+def _make_opts(count):
+    opts = []
+    for i in range(count):
+        if i % 2:
+            opts.append(options.IntOpt('opt%d' % i, default=i, helper='int option'))
+        else:
+            opts.append(options.StrOpt('opt%d' % i, default='value', helper='str option'))
+    return opts
+
+
+def run(count):
+    gc.collect()
+    tracemalloc.start()
+    opts = _make_opts(count)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    conf = options.ConfigOpts()
+    start = time.perf_counter()
+    conf.register_opts('group', opts)
+    register = time.perf_counter() - start
+
+    same = _make_opts(count)
+    start = time.perf_counter()
+    conf.register_opts('group', same)
+    again = time.perf_counter() - start
+    return {'count': count, 'bytes_per_opt': memory / count, 'register_s': register, 'register_again_s': again}
+
+
+def main(argv=None):
+    counts = [int(arg) for arg in (argv or sys.argv[1:])] or COUNTS
+    for count in counts:
+        result = run(count)
+        print("%(count)8d opts: %(bytes_per_opt)6.0f bytes/opt, register %(register_s).3f s, "
+              "register again %(register_again_s).3f s" % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Show that context-local overrides cost nothing to a config which never
+uses them: reading an option of a plain Config, of a Config whose
+neighbour uses overrides, and of the Config using them, outside and
+inside an override block.
+
+    python -m benchmarks.bench_override
+"""
+import timeit
+
+from src.cfg import Config
+from src.config import options
+
+NUMBER = 200000
+REPEAT = 5
+
+
+def make_config():
+    conf = Config()
+    conf.register_group("info", [
+        options.StrOpt('name', default='Joe', helper='name info'),
+        options.IntOpt('age', default=18, helper='age info'),
+    ])
+    conf.startup()
+    return conf
+
+
+def read(conf):
+    timer = timeit.Timer('conf.CONF.INFO.name', globals={'conf': conf})
+    return min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER * 1e9
+
+
+def main():
+    plain = make_config()
+    baseline = read(plain)
+
+    overridden = make_config()
+    with overridden.override(INFO={'name': 'canary'}):
+        inside = read(overridden)
+    outside = read(overridden)
+    neighbour = read(plain)
+
+    print("plain Config:                 %.1f ns/read" % baseline)
+    print("plain Config, overrides used: %.1f ns/read (%s)" % (neighbour, type(plain).__name__))
+    print("overridable, outside a block: %.1f ns/read" % outside)
+    print("overridable, inside a block:  %.1f ns/read" % inside)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Startup of a process which registers and reads a few groups of a central
+config of 50k sections: the eager startup scans the whole file and keeps the
+registered sections, the indexed store reads the index and loads a group on
+its first access.
+
+    python -m benchmarks.bench_sharded --groups 50000 --opts 4 --access 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import synthetic
+from src.cfg import Config
+from src.config import sharding
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _new_config(args, groups):
+    conf = Config()
+    for name in groups:
+        conf.register_group(name, synthetic.make_opts(args.opts))
+    return conf
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=50000)
+    parser.add_argument('--opts', type=int, default=4)
+    parser.add_argument('--access', type=int, default=3, help='the groups read after startup')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = synthetic.make_config(directory, 'ini', args.groups, args.opts)
+        size = os.path.getsize(config_file)
+        accessed = ['group%d' % (i * args.groups // args.access) for i in range(args.access)]
+
+        def read(conf):
+            for name in accessed:
+                conf.CONF[name].opt0
+
+        eager = _new_config(args, accessed)
+        eager_startup, _ = _timed(lambda: eager.startup(config_file))
+        eager_access, _ = _timed(lambda: read(eager))
+
+        build, _ = _timed(lambda: sharding.build_index(config_file))
+
+        lazy = _new_config(args, accessed)
+        lazy_startup, _ = _timed(lambda: lazy.startup(store=config_file))
+        lazy_access, _ = _timed(lambda: read(lazy))
+
+        print("%d sections of %d opts, %.1f MB" % (args.groups, args.opts, size / 1e6))
+        print("build index:             %8.1f ms" % (build * 1e3))
+        print("eager startup:           %8.1f ms, first access of %d groups %.3f ms"
+              % (eager_startup * 1e3, args.access, eager_access * 1e3))
+        print("indexed store startup:   %8.1f ms, first access of %d groups %.3f ms"
+              % (lazy_startup * 1e3, args.access, lazy_access * 1e3))
+        print("groups still pending:    %8d" % len(getattr(lazy.CONF, '_pending', ())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare the memory of pre-forked workers loading the config themselves
+with workers attached to the config published by the master.
+Linux only, the proportional set size (PSS) splits shared pages between
+the processes using them, so it shows the real per-worker cost.
+
+    python -m benchmarks.bench_shared_memory
+"""
+import os
+import sys
+import tempfile
+
+from benchmarks import synthetic
+from src.cfg import Config
+
+GROUPS = 200
+OPTS = 200
+WORKERS = 8
+
+
+def _memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def _make_conf():
+    conf = Config()
+    synthetic.register(conf, GROUPS, OPTS)
+    return conf
+
+
+def _worker(mode, config_file, shared_name, conn):
+    if mode == 'private':
+        conf = _make_conf()
+        conf.startup(config_file=config_file)
+    else:
+        # the schema is not needed, the values come from the master
+        conf = Config()
+        conf.attach_shared(shared_name)
+    for group in range(GROUPS):
+        values = conf.CONF["group%d" % group]
+        for opt in range(OPTS):
+            values["opt%d" % opt]
+    os.write(conn, ("%(Rss)d %(Pss)d\n" % _memory()).encode())
+    os._exit(0)
+
+
+def _run(mode, config_file, shared_name):
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _worker(mode, config_file, shared_name, write_fd)
+        pids.append(pid)
+    os.close(write_fd)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        results = [tuple(map(int, line.split())) for line in f]
+    rss = sum(r[0] for r in results) / len(results)
+    pss = sum(r[1] for r in results) / len(results)
+    print("%-8s workers: RSS %8.0f KiB  PSS %8.0f KiB per worker" % (mode, rss, pss))
+    return pss
+
+
+def main():
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("this benchmark needs Linux")
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = synthetic.make_config(directory, 'ini', GROUPS, OPTS)
+        master = _make_conf()
+        master.startup(config_file=config_file)
+        shared_name = master.publish_shared()
+        try:
+            private = _run('private', config_file, shared_name)
+            shared = _run('shared', config_file, shared_name)
+        finally:
+            master.close_shared()
+    print("saving: %.0f KiB per worker (%d options)" % (private - shared, GROUPS * OPTS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare reading an option through ConfigOpts/GroupOpt with reading it
+from a frozen snapshot.
+
+    python -m benchmarks.bench_snapshot
+"""
+import timeit
+
+from src.cfg import Config
+from src.config import options
+
+NUMBER = 1000000
+
+
+def main():
+    conf = Config()
+    conf.register_group("info", [
+        options.StrOpt('name', default='Joe', helper='name info'),
+        options.IntOpt('age', default=18, helper='age info'),
+    ])
+    snapshot = conf.snapshot()
+
+    dynamic = timeit.timeit('conf.CONF.INFO.name', globals={'conf': conf}, number=NUMBER)
+    frozen = timeit.timeit('snapshot.INFO.name', globals={'snapshot': snapshot}, number=NUMBER)
+    print("ConfigOpts access: %.1f ns/read" % (dynamic / NUMBER * 1e9))
+    print("snapshot access:   %.1f ns/read" % (frozen / NUMBER * 1e9))
+    print("speedup:           %.1fx" % (dynamic / frozen))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare the pure python yaml loader with libyaml on a large synthetic
+yaml file split in several documents.
+
+    python -m benchmarks.bench_yaml
+"""
+import os
+import tempfile
+import time
+
+import yaml
+
+from src.config import utils
+
+GROUPS = 500
+OPTS = 50
+DOCUMENTS = 10
+
+
+def _make_config(directory):
+    config_file = os.path.join(directory, 'config.yaml')
+    with open(config_file, 'w') as f:
+        for group in range(GROUPS):
+            if group and group % (GROUPS // DOCUMENTS) == 0:
+                f.write("---\n")
+            f.write("group%d:\n" % group)
+            for opt in range(OPTS):
+                f.write("  opt%d: value %d of group %d\n" % (opt, opt, group))
+    return config_file
+
+
+def _timeit(config_file, loader):
+    start = time.perf_counter()
+    utils.load_yaml_config(config_file, loader=loader)
+    return time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = _make_config(directory)
+        print("%d options, %d documents, %.1f MiB" % (
+            GROUPS * OPTS, DOCUMENTS, os.path.getsize(config_file) / 1024 / 1024))
+        python = _timeit(config_file, yaml.SafeLoader)
+        print("SafeLoader:  %.3f s" % python)
+        if not hasattr(yaml, 'CSafeLoader'):
+            print("CSafeLoader: libyaml is not available")
+            return
+        libyaml = _timeit(config_file, yaml.CSafeLoader)
+        print("CSafeLoader: %.3f s (%.1fx)" % (libyaml, python / libyaml))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite of the startup, load, access and reload paths.
+The results are written as json, so runs of different versions can be
+compared.
+
+    python -m benchmarks.run --groups 50 --opts 100 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+from src.cfg import Config
+from src.config import utils
+
+
+def measure(func, repeat=5, number=1):
+    """
+    :return: the min and median seconds of one call of func
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'number': number, 'repeat': repeat}
+
+
+def _new_config(args):
+    conf = Config()
+    synthetic.register(conf, args.groups, args.opts)
+    return conf
+
+
+def bench_register(args):
+    def register():
+        synthetic.register(Config(), args.groups, args.opts)
+    return {'register_group': measure(register, args.repeat)}
+
+
+def bench_loaders(args, files):
+    results = {}
+    for fmt, path in files.items():
+        if fmt == 'yaml':
+            results['load_yaml_config'] = measure(lambda: utils.load_yaml_config(path), args.repeat)
+        else:
+            results['load_ini_cofing[%s]' % fmt] = measure(lambda: utils.load_ini_cofing(path), args.repeat)
+            results['load_ini_stream[%s]' % fmt] = measure(lambda: utils.load_ini_stream(path), args.repeat)
+    return results
+
+
+def bench_startup(args, files):
+    results = {}
+    for fmt, path in files.items():
+        for lazy in (False, True):
+            def startup():
+                _new_config(args).startup(config_file=path, lazy=lazy)
+            results['startup[%s%s]' % (fmt, ',lazy' if lazy else '')] = measure(startup, args.repeat)
+    return results
+
+
+def bench_access(args, files):
+    conf = _new_config(args)
+    conf.startup(config_file=files['ini'])
+    snapshot = conf.snapshot()
+    number = 100000
+
+    def group_opt():
+        conf.CONF.GROUP0.opt0
+
+    def item():
+        conf.CONF['group0']['opt0']
+
+    def frozen():
+        snapshot.GROUP0.opt0
+
+    return {
+        'access[attribute]': measure(group_opt, args.repeat, number),
+        'access[item]': measure(item, args.repeat, number),
+        'access[snapshot]': measure(frozen, args.repeat, number),
+    }
+
+
+def bench_reload(args, directory):
+    path = os.path.join(directory, 'reload.ini')
+    results = {}
+    cases = {
+        'reload[unchanged]': (),
+        'reload[one_changed]': ((0, 3),),
+        'reload[all_changed]': tuple((g, o) for g in range(args.groups) for o in range(args.opts)),
+    }
+    for name, changed in cases.items():
+        conf = _new_config(args)
+        synthetic.write_config(path, 'ini', args.groups, args.opts, args.value_size)
+        conf.startup(config_file=path)
+        toggle = [False]
+
+        def reload():
+            # switch between the two files so every reload sees the change
+            toggle[0] = not toggle[0]
+            synthetic.write_config(path, 'ini', args.groups, args.opts, args.value_size,
+                                   changed=changed if toggle[0] else ())
+            conf.reload()
+        results[name] = measure(reload, args.repeat)
+    return results
+
+
+def _version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        files = {fmt: synthetic.make_config(directory, fmt, args.groups, args.opts, args.value_size)
+                 for fmt in synthetic.FORMATS}
+        results = {}
+        results.update(bench_register(args))
+        results.update(bench_loaders(args, files))
+        results.update(bench_startup(args, files))
+        results.update(bench_access(args, files))
+        results.update(bench_reload(args, directory))
+    return {
+        'version': _version(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'params': {'groups': args.groups, 'opts': args.opts, 'value_size': args.value_size},
+        'results': results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--opts', type=int, default=100, help='opts per group')
+    parser.add_argument('--value-size', type=int, default=16, help='characters of a str value')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='the json file to write, default is stdout')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic config files and schemas for the benchmarks.
+
+Group i is named group<i> and has opts opt<j>. Every fourth opt is an
+IntOpt, the others are StrOpt with values of `value_size` characters.
+"""
+import os
+
+from src.config import options
+
+FORMATS = ('ini', 'yaml', 'conf')
+
+
+def _value(group, opt, value_size):
+    if opt % 4 == 3:
+        return str(group * 1000 + opt)
+    text = "v%d_%d_" % (group, opt)
+    return (text * (value_size // len(text) + 1))[:value_size]
+
+
+def make_opts(opts):
+    result = []
+    for opt in range(opts):
+        if opt % 4 == 3:
+            result.append(options.IntOpt('opt%d' % opt, default=0, helper='int option %d' % opt))
+        else:
+            result.append(options.StrOpt('opt%d' % opt, default='', helper='str option %d' % opt))
+    return result
+
+
+def register(conf, groups, opts):
+    """register the synthetic schema to a Config"""
+    for group in range(groups):
+        conf.register_group('group%d' % group, make_opts(opts))
+
+
+def config_map(groups, opts, value_size=16, changed=()):
+    """
+    :param changed: (group, opt) pairs whose value is changed, to simulate a reload
+    """
+    result = {}
+    for group in range(groups):
+        values = result['group%d' % group] = {}
+        for opt in range(opts):
+            value = _value(group, opt, value_size)
+            if (group, opt) in changed:
+                value = str(int(value) + 1) if opt % 4 == 3 else value[::-1]
+            values['opt%d' % opt] = value
+    return result
+
+
+def write_config(path, fmt, groups, opts, value_size=16, changed=()):
+    """
+    write a synthetic config file
+    :param fmt: ini, yaml or conf
+    :return: path
+    """
+    data = config_map(groups, opts, value_size, changed)
+    with open(path, 'w') as f:
+        for group, values in data.items():
+            if fmt == 'yaml':
+                f.write("%s:\n" % group)
+                for key, value in values.items():
+                    f.write("  %s: '%s'\n" % (key, value))
+            else:
+                f.write("[%s]\n" % group)
+                for key, value in values.items():
+                    f.write("%s = %s\n" % (key, value))
+    return path
+
+
+def make_config(directory, fmt, groups, opts, value_size=16, changed=()):
+    return write_config(os.path.join(directory, 'config.%s' % fmt), fmt, groups, opts,
+                        value_size=value_size, changed=changed)
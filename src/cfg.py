@@ -6,36 +6,128 @@
 @Author  : lex(luohai2233@163.com)
 
 The module to parse the config file
+
+Only what startup needs is imported with the module, the optional features
+(async, overrides, shared memory, watching, instrumentation, code generation)
+import their modules on first use. The global `cfg` is created on first access.
 """
-from typing import List
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from typing import TYPE_CHECKING, List
 
 from src.config import options as opt
 from src.config import exceptions
+from src.config import interpolation
+from src.config import loaders
 from src.config import utils
 
+if TYPE_CHECKING:
+    import argparse
+
+    from src.config import instrument
+    from src.config import watcher
+
+LOG = logging.getLogger(__name__)
+
+# a change of an option made by reload, name is like INFO.name
+ChangeEvent = namedtuple('ChangeEvent', ['name', 'old', 'new'])
+
+# a published config kept in the history, see Config.rollback
+ConfigVersion = namedtuple('ConfigVersion', ['version', 'time', 'conf', 'config_map', 'interpolator'])
+
 
 class Config(object):
+    """
+    Thread safety: `CONF` is never changed in place after startup. A reload
+    builds the new options aside and replaces `CONF` at once, so readers are
+    not locked and never see a half applied reload. Each read of `cfg.CONF`
+    may see a newer config; keep a reference, conf = cfg.CONF, to read
+    several options of the same version. Reloads are serialized. startup and
+    the set_* methods do change the options in place and should be done
+    before the readers start.
+
+    Every startup, reload and rollback publishes a version of the config,
+    `version` tells which one `CONF` is. The last `history` versions are
+    kept, they share the groups they did not change.
+    """
 
     GROUP_REGISTERED = False
 
-    def __init__(self):
+    def __init__(self, history=10):
         self.config_file = None
+        self.config_format = None
+        self.config_dirs = []
+        self.store = None  # see `sharding`
         self.config_map = None
+        self.override_map = {}  # {GROUP: {opt: value}} of the environment and the command line
+        self.cache_dir = None
         self.CONF = None
+        self._watcher = None
+        self._publisher = None
+        self._access_stats = None
+        self._interpolator = interpolation.Interpolator()
+        self._listeners = {}  # {(group, opt): [callback]}
+        self._subscribers = []  # [callback(ChangeEvent)] of every change
+        self._reload_lock = threading.Lock()
+        self._history = deque(maxlen=history)  # [ConfigVersion]
+        self._last_version = 0
         self._setup_cfg()
 
     def _setup_cfg(self):
         self.CONF = opt.ConfigOpts()
 
-    def _load_config_file(self):
-        config_map = None
-        conf_type = utils.get_config_file_type(self.config_file)
-        if conf_type == 'ini':
-            config_map = utils.load_ini_cofing(self.config_file)
-        elif conf_type == 'yaml':
-            config_map = utils.load_yaml_config(self.config_file)
-        elif conf_type == 'conf':
-            config_map = utils.load_conf_config(self.config_file)
+    def _load_config_file(self, config_file=None):
+        config_file = config_file or self.config_file
+        config_format = self.config_format if config_file is self.config_file else None
+        loader = loaders.detect(config_file, config_format)
+        if not loader.cacheable:
+            return loader.load(config_file)
+        # only the sections of the registered groups are kept
+        groups = frozenset(self.CONF._group)
+        load = functools.partial(loader.load, groups=groups)
+        if self.cache_dir is not None and isinstance(config_file, (str, os.PathLike)):
+            key = "%s:%s" % (loader.name, ",".join(sorted(groups)))
+            return utils.load_cached_config(config_file, load, self.cache_dir, key=key)
+        return load(config_file)
+
+    def _config_files(self):
+        """the config file followed by the sorted files of each drop-in directory"""
+        files = [self.config_file] if self.config_file else []
+        for config_dir in self.config_dirs:
+            files.extend(utils.list_config_dir(config_dir, suffixes=loaders.suffixes()))
+        return files
+
+    def _load_config(self):
+        """
+        load the config file and the drop-in directories into one config map,
+        the files are parsed in parallel and merged in order, later wins
+        """
+        if self.store is not None:
+            # the groups not loaded yet stay pending in the new config
+            from src.config import sharding
+            self.store.refresh()
+            conf = self._global_conf()
+            pending = sharding.pending_groups(conf)
+            groups = self.store.groups()
+            return {name: self.store.load_group(name) or {} for name in conf._group
+                    if name in groups and name not in pending}
+        files = self._config_files()
+        if len(files) == 1:
+            return self._load_config_file(files[0])
+        config_map = {}
+        if not files:
+            return config_map
+        from concurrent import futures
+        with futures.ThreadPoolExecutor(max_workers=min(len(files), 8)) as executor:
+            for file_map in executor.map(self._load_config_file, files):
+                utils.merge_config_map(config_map, file_map)
         return config_map
 
     def set_default_config(self, sections):
@@ -57,6 +149,19 @@ class Config(object):
         self.CONF.register_opts(group.upper(), opts)
         self.GROUP_REGISTERED = True
 
+    def overlay(self) -> 'Config':
+        """
+        make a Config sharing the registered groups, defaults and current
+        values of this one, like a per-tenant config. It is copy-on-write:
+        only the groups changed through its CONF are copied, and the values
+        set in either Config are not seen by the other.
+        :return: an object of Config
+        """
+        conf = Config()
+        conf.CONF = self.CONF.overlay()
+        conf.GROUP_REGISTERED = self.GROUP_REGISTERED
+        return conf
+
     def validate_sections(self, sections):
         if sections == '' or sections == {}:
             raise exceptions.EmptySections()
@@ -67,24 +172,607 @@ class Config(object):
         if not isinstance(opts, list):
             raise exceptions.OptsFormatError()
 
-    def startup(self, config_file=None, auto_find=False):
+    def snapshot(self) -> opt.FrozenConfig:
+        """
+        compile the current config into an immutable snapshot, options of
+        the snapshot are read as plain attributes: snapshot.INFO.name
+        :return: an object of FrozenConfig
+        """
+        return self.CONF.freeze()
+
+    def export(self, stream=None, config_format='json'):
+        """
+        write the effective config, the converted values of all the options,
+        with groups and options sorted. See `export`.
+        :param stream: a text file object, default is to return a string
+        :param config_format: ini, yaml or json
+        :return: the text if stream is None
+        """
+        from src.config import export
+        chunks = export.iter_export(self.CONF.option_values(), config_format)
+        if stream is None:
+            return ''.join(chunks)
+        for chunk in chunks:
+            stream.write(chunk)
+
+    def fingerprint(self) -> str:
+        """
+        a stable hash of the effective config for drift detection, hosts
+        with the same values have the same fingerprint. It is cheap to ask
+        for repeatedly, only the groups changed by a reload are hashed again.
+        :return: 16 hex digits
+        """
+        return self.CONF.fingerprint()
+
+    def compile(self, config_file, output=None) -> str:
+        """
+        validate a config file against the registered groups and write its
+        converted values in the compiled binary format. Starting up from the
+        compiled file skips parsing and converting the options.
+        :param config_file: the path of an ini, yaml or conf file
+        :param output: the path of the compiled file, default is config_file
+                       with the suffix replaced by .oocc
+        :return: the path of the compiled file
+        """
+        if not self.GROUP_REGISTERED:
+            raise exceptions.GroupNoRegistered()
+        config_map = self._load_config_file(config_file)
+        conf, _ = self.CONF.update(config_map)
+        interpolator = interpolation.Interpolator()
+        interpolator.compile(conf)
+        interpolator.resolve(conf)
+        if output is None:
+            output = os.path.splitext(config_file)[0] + utils.COMPILED_SUFFIX
+        utils.write_compiled_config(output, conf.converted_values(config_map))
+        return output
+
+    def generate(self, output=None) -> str:
+        """
+        generate a module of typed, slotted classes of the registered groups,
+        see `codegen`. Build them with module.from_config(cfg) after startup.
+        :param output: if given, the path of the module to write
+        :return: the source of the module
+        """
+        if not self.GROUP_REGISTERED:
+            raise exceptions.GroupNoRegistered()
+        from src.config import codegen
+        source = codegen.generate(self.CONF)
+        if output is not None:
+            with open(output, 'w') as f:
+                f.write(source)
+        return source
+
+    def startup(self, config_file=None, auto_find=False, cache_dir=None, lazy=False,
+                config_dirs=None, project=None, env_prefix=None, argv=None, config_format=None,
+                store=None):
         """
         main method of load config file
-        :param config_file: the absolute path of config_file, like, /etc/project/config.ini
+        :param config_file: the absolute path of config_file, like, /etc/project/config.ini,
+                            or its content as bytes or a file object
         :param sections: the default config group to register
-        :param auto_find: if config_file is None, whether to find config file
+        :param auto_find: if config_file and config_dirs are None, whether to find
+                          the config in the standard locations, see `utils.find_config_files`
+        :param cache_dir: if given, keep the parsed config file in this directory
+                          and reuse it in the next startup while the file does not change
+        :param lazy: convert and validate the value of an option on its first read,
+                     call `validate_all` to still fail fast
+        :param config_dirs: drop-in directories, their files are applied over
+                            config_file in sorted order, the last one wins
+        :param project: the name used by auto_find, default is the name of the program
+        :param env_prefix: if given, override the options with the environment
+                           variables like OOCFG_INFO__NAME for the prefix OOCFG_
+        :param argv: override the options with --info-name value arguments, a list
+                     like sys.argv[1:] or the namespace of a parser given to `add_arguments`.
+                     The command line wins over the environment, which wins over the files
+        :param config_format: the format of config_file, like json, see `loaders`,
+                              default is detected from its suffix or content
+        :param store: instead of config_file, a sharded store: a directory with one
+                      file per group, or an ini file indexed by `sharding.build_index`.
+                      A group is only read from the store when first accessed
         :return:
         """
         # this method should be called after register_all_group
-        if config_file is None and not auto_find:
+        if store is not None:
+            self._startup_store(store, env_prefix=env_prefix, argv=argv)
+            return
+        if config_file is None and not config_dirs and auto_find:
+            project = project or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+            config_file, config_dirs = utils.find_config_files(project, suffixes=loaders.suffixes())
+        self.override_map = self._find_overrides(env_prefix, argv)
+        if config_file is None and not config_dirs:
             # the default config value is enough
+            self.CONF.set_config_file_value({}, overrides=self.override_map)
+            self.interpolate()
+            self._commit(self.CONF, self.config_map, self._interpolator)
             return
+        if config_file is not None and not isinstance(config_file, (str, os.PathLike)):
+            # read a stream once, reload parses the same content again
+            config_file = loaders.Source(config_file)
         self.config_file = config_file
-        self.config_map = self._load_config_file()
+        self.config_format = config_format
+        self.config_dirs = list(config_dirs or [])
+        self.cache_dir = cache_dir
+        self.config_map = self._load_config()
         if not self.GROUP_REGISTERED:
             raise exceptions.GroupNoRegistered()
-        self.CONF.set_config_file_value(self.config_map)
+        self.CONF.set_config_file_value(self.config_map, lazy=lazy, overrides=self.override_map)
+        self.interpolate()
+        self._commit(self.CONF, self.config_map, self._interpolator)
+
+    def _startup_store(self, store, env_prefix=None, argv=None):
+        from src.config import sharding
+        if not self.GROUP_REGISTERED:
+            raise exceptions.GroupNoRegistered()
+        self.store = sharding.open_store(store)
+        self.override_map = self._find_overrides(env_prefix, argv)
+        self.config_map = {}
+        self.CONF.set_config_file_value({}, overrides=self.override_map)
+        self.interpolate()
+        sharding.defer(self.CONF, self.store, overrides=self.override_map, on_load=self._on_group_load)
+        # the referenced groups are loaded now, each load interpolates its dependents again
+        sharding.load_references(self.CONF, self._interpolator.templates)
+        self._commit(self.CONF, self.config_map, self._interpolator)
+
+    def _on_group_load(self, conf, name, values):
+        # a group of the store was read for the first time by conf, the
+        # templates depending on it were resolved from its defaults
+        from src.config import sharding
+        current = conf is self._global_conf()
+        if current:
+            self.config_map[name] = values
+        interpolator = self._interpolator.copy()
+        templates = {(name, key): value for key, value in values.items() if opt.is_ref(value)}
+        if templates or any((name, key) in interpolator.templates for key in values):
+            sharding.load_references(conf, templates)
+            interpolator.compile(conf)
+        keys = interpolator._affected({(name, key) for key in values})
+        if keys:
+            interpolator.resolve(conf, keys)
+        if current:
+            self._interpolator = interpolator
+            self._record_group_load(conf, name, values, {name} | {group for group, _ in keys}, interpolator)
+
+    def _record_group_load(self, conf, name, values, groups, interpolator):
+        # CONF is an overlay of the stored version, keep the groups loaded
+        # through it in the version, so a rollback does not read the store again
+        from src.config import sharding
+        for index, entry in enumerate(self._history):
+            if entry.version == conf.version:
+                entry.config_map[name] = values
+                sharding.copy_groups(entry.conf, conf, groups)
+                self._history[index] = entry._replace(interpolator=interpolator)
+                return
+
+    def _find_overrides(self, env_prefix=None, argv=None):
+        if env_prefix is None and argv is None:
+            return {}
+        from src.config import overrides
+        index = overrides.OverrideIndex(self.CONF, prefix=env_prefix or overrides.DEFAULT_PREFIX)
+        override_map = index.match_environ() if env_prefix is not None else {}
+        if argv is not None:
+            if isinstance(argv, (list, tuple)):
+                utils.merge_config_map(override_map, index.match_argv(argv))
+            else:
+                utils.merge_config_map(override_map, index.match_namespace(argv))
+        return override_map
+
+    def add_arguments(self, parser: 'argparse.ArgumentParser'):
+        """
+        add a --group-opt argument, helped by the helper of the option, for
+        every registered option. Give the parsed namespace to startup:
+
+            cfg.add_arguments(parser)
+            cfg.startup(config_file, argv=parser.parse_args())
+
+        :param parser: an argparse.ArgumentParser
+        :return:
+        """
+        from src.config import overrides
+        overrides.OverrideIndex(self.CONF).add_arguments(parser)
+
+    def interpolate(self):
+        """
+        interpolate the ${GROUP.opt} and ${env:NAME} references of the
+        defaults and the config file values, startup and reload do it.
+        See `interpolation` for the syntax.
+        :return:
+        """
+        # the interpolator of a published version is never changed
+        interpolator = self._interpolator.copy()
+        interpolator.compile(self.CONF)
+        interpolator.resolve(self.CONF)
+        self._interpolator = interpolator
+
+    def validate_all(self):
+        """
+        convert and validate every option of a lazy startup now,
+        raise exception if error
+        :return:
+        """
+        self.CONF.validate_all()
+
+    def reload(self):
+        """
+        reload the config file.
+        Only the options changed since the last load are converted again,
+        the new values are built aside and published by replacing `CONF`
+        at once, so readers are never blocked and never see a half applied
+        config. If the file is invalid the current config is kept.
+        :return:
+        """
+        if self.config_file is None and not self.config_dirs and self.store is None:
+            return
+        with self._reload_lock:
+            config_map = self._load_config()
+            current = self._global_conf()
+            conf, changes = current.update(config_map, self.config_map, overrides=self.override_map)
+            if self.store is not None:
+                from src.config import sharding
+                templates = {(group, key): value for group, values in config_map.items()
+                             for key, value in values.items() if opt.is_ref(value)}
+                templates.update(self._interpolator.templates)
+                sharding.load_references(conf, templates)
+            interpolator = self._interpolator.copy()
+            changes += interpolator.refresh(current, conf)
+            self._commit(conf, config_map, interpolator)
+        self._notify(changes)
+
+    def _commit(self, conf, config_map, interpolator):
+        """publish conf as a new version and keep it in the history"""
+        self._last_version += 1
+        conf.version = self._last_version
+        self._history.append(ConfigVersion(conf.version, time.time(), conf, config_map, interpolator))
+        self._publish(conf, config_map, interpolator)
+
+    def _global_conf(self):
+        # CONF without the overrides of the current context, see `override`
+        return self.__dict__['CONF']
+
+    def _publish(self, conf, config_map, interpolator):
+        # the groups loaded from a store later on are added to the map, keep
+        # the one of the history as it is
+        self.config_map = dict(config_map) if self.store is not None else config_map
+        self._interpolator = interpolator
+        # the version in the history is never changed, a write to CONF copies what it changes
+        self.CONF = conf.overlay()
+        if self._publisher is not None:
+            self._publisher.publish(conf.effective_values())
+
+    @property
+    def version(self) -> int:
+        """the version of the current config, 0 before startup"""
+        return self.CONF.version
+
+    def versions(self) -> List[int]:
+        """the versions kept in the history, the oldest first"""
+        return [entry.version for entry in self._history]
+
+    def rollback(self, version=None):
+        """
+        publish a version of the history again, the files are not read
+        and the options are not converted or validated again.
+        The next reload applies the files over the rolled back version.
+        With a store, the groups never read while the version was current
+        are still loaded from the store on their first access.
+        :param version: the version to restore, default is the previous one
+        :return:
+        """
+        with self._reload_lock:
+            current = self._global_conf()
+            versions = self.versions()
+            if version is None:
+                index = versions.index(current.version) if current.version in versions else len(versions)
+                if index < 1:
+                    raise exceptions.ConfigVersionNotFoundError(version=current.version - 1)
+                version = versions[index - 1]
+            if version not in versions:
+                raise exceptions.ConfigVersionNotFoundError(version=version)
+            entry = self._history[versions.index(version)]
+            self._publish(entry.conf, entry.config_map, entry.interpolator)
+            changes = entry.conf.diff(current) if self._listeners or self._subscribers else []
+        self._notify(changes)
+
+    @contextlib.contextmanager
+    def override(self, **groups):
+        """
+        override options in the current context only, the other threads and
+        asyncio tasks keep reading the global config. Overrides nest, the
+        values are converted like the ones of the config file:
+
+            with cfg.override(INFO={'name': 'canary'}):
+                cfg.CONF.INFO.name  # canary
+
+        A reload during the block is seen with the overrides applied over it.
+        The class of this Config is switched on first use, so a Config which
+        never overrides keeps reading CONF as a plain attribute.
+        :param groups: {group: {opt: value}}
+        :return: the overridden ConfigOpts
+        """
+        if not isinstance(self, _OverridableConfig):
+            with self._reload_lock:
+                if not isinstance(self, _OverridableConfig):
+                    self._override_var = contextvars.ContextVar('oocfg_override', default=None)
+                    self.__class__ = _overridable_class(type(self))
+        outer = self._override_var.get()
+        values = {}
+        if outer is not None:
+            utils.merge_config_map(values, outer.values)
+        utils.merge_config_map(values, {group.replace(" ", "").upper(): opts for group, opts in groups.items()})
+        frame = _OverrideFrame(values)
+        # invalid values raise here, before the block
+        frame.apply(self._global_conf(), self._interpolator)
+        token = self._override_var.set(frame)
+        try:
+            yield frame.conf
+        finally:
+            self._override_var.reset(token)
+
+    def enable_instrumentation(self, sample=1, dump_interval=None, dump=None) -> 'instrument.AccessStats':
+        """
+        count the reads of every option of the registered groups.
+        Groups registered later are not counted. A config without
+        instrumentation pays nothing for it.
+        :param sample: count one read out of sample
+        :param dump_interval: if given, call dump(report) every dump_interval seconds
+        :param dump: the callback of the periodic dump
+        :return: the counters
+        """
+        if dump_interval is not None and dump is None:
+            raise exceptions.DumpCallbackMissingError(interval=dump_interval)
+        self.disable_instrumentation()
+        from src.config import instrument
+        stats = instrument.AccessStats(sample=sample)
+        stats.instrument(self.CONF)
+        self._access_stats = stats
+        if dump_interval is not None:
+            stats.start_dump(dump_interval, lambda: dump(self.access_report()))
+        return stats
+
+    def disable_instrumentation(self):
+        stats = self._access_stats
+        if stats is None:
+            return
+        stats.stop_dump()
+        stats.uninstrument(self.CONF)
+        # the versions published while instrumented may be rolled back to
+        for entry in self._history:
+            stats.uninstrument(entry.conf)
+        self._access_stats = None
+
+    def access_report(self, top=10) -> dict:
+        """
+        report the hot options and the never read options since the
+        instrumentation was enabled, see `AccessStats.report`
+        """
+        if self._access_stats is None:
+            return None
+        return self._access_stats.report(self.CONF, top=top)
+
+    def publish_shared(self, name=None) -> str:
+        """
+        publish the effective config into shared memory for pre-forked
+        workers, see `attach_shared`. Later reloads are published as well.
+        Should be called in the master after startup.
+        :param name: the name of the shared memory segment
+        :return: the name of the shared memory segment
+        """
+        if self._publisher is None:
+            from src.config import shared
+            self._publisher = shared.SharedConfigPublisher(name)
+        self._publisher.publish(self.CONF.effective_values())
+        return self._publisher.name
+
+    def attach_shared(self, name):
+        """
+        read the config published by the master through `publish_shared`
+        instead of loading it again. CONF becomes read-only and follows the
+        reloads of the master.
+        :param name: the name of the shared memory segment
+        :return:
+        """
+        from src.config import shared
+        self.CONF = shared.SharedConfigOpts(name)
+
+    def close_shared(self):
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+
+    def on_change(self, name: str, callback):
+        """
+        subscribe to the changes of an option made by reload, the callback
+        is only called when the converted value really changed
+        :param name: the option to watch, like INFO.name
+        :param callback: called as callback(name, old_value, new_value)
+        :return:
+        """
+        group, _, opt_name = name.partition('.')
+        key = (group.replace(" ", "").upper(), opt_name)
+        self._listeners.setdefault(key, []).append(callback)
+
+    def _notify(self, changes):
+        for group, opt_name, old, new in changes:
+            for callback in self._listeners.get((group, opt_name), ()):
+                try:
+                    callback("%s.%s" % (group, opt_name), old, new)
+                except Exception:
+                    LOG.exception("Change callback of %s.%s failed", group, opt_name)
+            if self._subscribers:
+                event = ChangeEvent("%s.%s" % (group, opt_name), old, new)
+                for subscriber in tuple(self._subscribers):
+                    try:
+                        subscriber(event)
+                    except Exception:
+                        LOG.exception("Change subscriber of %s failed", event.name)
+
+    async def astartup(self, *args, executor=None, **kwargs):
+        """
+        startup in an executor, the reading and parsing of the files do not
+        block the event loop. Takes the arguments of `startup`.
+        :param executor: default is the default executor of the loop
+        :return:
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, functools.partial(self.startup, *args, **kwargs))
+
+    async def areload(self, executor=None):
+        """
+        reload in an executor, see `reload`
+        :param executor: default is the default executor of the loop
+        :return:
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, self.reload)
+
+    def changes(self, names=None) -> '_ChangeStream':
+        """
+        iterate over the changes made by the reloads from the call on,
+        whichever thread reloads. Must be called in a running event loop:
+
+            async for event in cfg.changes():
+                print(event.name, event.old, event.new)
+
+        :param names: if given, only the changes of these options, like ['INFO.name']
+        :return: an async iterator of ChangeEvent, subscribed until its aclose
+        """
+        return _ChangeStream(self, names)
+
+    def watch(self, interval=1.0, debounce=0.2, use_inotify=True) -> 'watcher.ConfigWatcher':
+        """
+        watch the config file and the drop-in directories and reload them on change
+        :param interval: seconds between two polls of the file
+        :param debounce: seconds the file has to be quiet before reloading
+        :param use_inotify: use inotify when the platform supports it
+        :return: the started watcher
+        """
+        if self.config_file is None and not self.config_dirs and self.store is None:
+            raise exceptions.ConfigFileNotFoundError(file=self.config_file)
+        self.stop_watch()
+        files = [self.config_file] if isinstance(self.config_file, (str, os.PathLike)) else []
+        directories = list(self.config_dirs)
+        if self.store is not None:
+            if os.path.isdir(self.store.path):
+                directories.append(self.store.path)
+            else:
+                files.append(self.store.path)
+        from src.config import watcher
+        self._watcher = watcher.ConfigWatcher(files, self.reload, interval=interval, debounce=debounce,
+                                              use_inotify=use_inotify, directories=directories)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watch(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+
+class _ChangeStream(object):
+    """
+    the async iterator of `Config.changes`. It subscribes when it is made,
+    not on the first __anext__, so no change made in between is lost.
+    """
+
+    def __init__(self, config, names=None):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self._queue = queue = asyncio.Queue()
+        if names is not None:
+            names = {"%s.%s" % (group.replace(" ", "").upper(), opt_name)
+                     for group, _, opt_name in (name.partition('.') for name in names)}
+
+        def subscriber(event):
+            if names is None or event.name in names:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        self._config = config
+        self._subscriber = subscriber
+        config._subscribers.append(subscriber)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ChangeEvent:
+        if self._subscriber is None:
+            raise StopAsyncIteration
+        return await self._queue.get()
+
+    async def aclose(self):
+        """unsubscribe, the iteration stops"""
+        if self._subscriber is not None:
+            self._config._subscribers.remove(self._subscriber)
+            self._subscriber = None
+
+
+class _OverrideFrame(object):
+    """the overrides of a `Config.override` block and the config built for them"""
+    __slots__ = ('values', 'base', 'conf')
+
+    def __init__(self, values):
+        self.values = values
+        self.base = None
+        self.conf = None
+
+    def apply(self, base, interpolator):
+        conf = base.overlay()
+        for group, opts in self.values.items():
+            if group not in conf._group:
+                raise exceptions.NoSuchGroup("No such Group %s" % group)
+            for opt_name in opts:
+                if opt_name not in conf._group[group]._opts:
+                    raise exceptions.NoSuchOpt(opt_name)
+        conf.set_config_file_value({}, overrides=self.values)
+        # the options interpolating an overridden one follow it
+        interpolator.copy().refresh(base, conf)
+        self.conf = conf
+        self.base = base
+
+
+class _OverridableConfig(object):
+    """
+    mixed into the class of a Config once `override` was used, CONF is
+    looked up in the current context before the global config
+    """
+
+    @property
+    def CONF(self):
+        base = self._global_conf()
+        frame = self._override_var.get()
+        if frame is None:
+            return base
+        if frame.base is not base:
+            # reloaded since the block started
+            frame.apply(base, self._interpolator)
+        return frame.conf
+
+    @CONF.setter
+    def CONF(self, conf):
+        self.__dict__['CONF'] = conf
+
+
+_overridable_classes = {}  # {Config class: its overridable subclass}
+
+
+def _overridable_class(cls):
+    # a subclass of the class of the Config, so its own methods are kept
+    overridable = _overridable_classes.get(cls)
+    if overridable is None:
+        overridable = _overridable_classes.setdefault(
+            cls, type('Overridable' + cls.__name__, (_OverridableConfig, cls), {}))
+    return overridable
+
+
+_cfg_lock = threading.Lock()
 
 
-cfg = Config()
+def __getattr__(name):
+    # the global cfg is created on first access, `from src.cfg import cfg` works as before
+    if name == 'cfg':
+        with _cfg_lock:
+            if 'cfg' not in globals():
+                globals()['cfg'] = Config()
+        return globals()['cfg']
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
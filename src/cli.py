@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+The command line tools of oocfg
+
+    oocfg compile --schema myproject.conf:cfg /etc/myproject/config.ini
+    oocfg generate --schema myproject.conf:cfg -o myproject/settings.py
+    oocfg export --schema myproject.conf:cfg --format yaml /etc/myproject/config.ini
+    oocfg fingerprint --schema myproject.conf:cfg /etc/myproject/config.ini
+    oocfg index /etc/central/config.ini
+"""
+import argparse
+import importlib
+import sys
+
+from src.cfg import Config
+
+
+def load_schema(schema: str) -> Config:
+    """
+    import the Config which has the groups registered
+    :param schema: module[:attribute], the attribute defaults to cfg
+    :return: an object of Config
+    """
+    module_name, _, attr = schema.partition(':')
+    module = importlib.import_module(module_name)
+    conf = getattr(module, attr or 'cfg')
+    if not isinstance(conf, Config):
+        raise SystemExit("%s is not a Config" % schema)
+    return conf
+
+
+def _compile(args):
+    conf = load_schema(args.schema)
+    print(conf.compile(args.config_file, output=args.output))
+
+
+def _generate(args):
+    conf = load_schema(args.schema)
+    source = conf.generate(output=args.output)
+    if args.output is None:
+        sys.stdout.write(source)
+    else:
+        print(args.output)
+
+
+def _export(args):
+    conf = load_schema(args.schema)
+    conf.startup(config_file=args.config_file)
+    conf.export(sys.stdout, config_format=args.format)
+
+
+def _fingerprint(args):
+    conf = load_schema(args.schema)
+    conf.startup(config_file=args.config_file)
+    print(conf.fingerprint())
+
+
+def _index(args):
+    from src.config import sharding
+    print(sharding.build_index(args.config_file, output=args.output))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='oocfg')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compile_parser = commands.add_parser('compile', help='compile a config file into the binary format')
+    compile_parser.add_argument('config_file', help='the ini, yaml or conf file')
+    compile_parser.add_argument('--schema', required=True,
+                                help='module[:attribute] of the Config with the registered groups')
+    compile_parser.add_argument('-o', '--output', help='the path of the compiled file')
+    compile_parser.set_defaults(func=_compile)
+
+    generate_parser = commands.add_parser('generate', help='generate typed classes of the registered groups')
+    generate_parser.add_argument('--schema', required=True,
+                                 help='module[:attribute] of the Config with the registered groups')
+    generate_parser.add_argument('-o', '--output', help='the path of the module, default is stdout')
+    generate_parser.set_defaults(func=_generate)
+
+    export_parser = commands.add_parser('export', help='write the effective config of a config file')
+    export_parser.add_argument('config_file', help='the config file')
+    export_parser.add_argument('--schema', required=True,
+                               help='module[:attribute] of the Config with the registered groups')
+    export_parser.add_argument('-f', '--format', default='json', choices=['ini', 'yaml', 'json'],
+                               help='the format of the output')
+    export_parser.set_defaults(func=_export)
+
+    fingerprint_parser = commands.add_parser('fingerprint', help='print the fingerprint of the effective config')
+    fingerprint_parser.add_argument('config_file', help='the config file')
+    fingerprint_parser.add_argument('--schema', required=True,
+                                    help='module[:attribute] of the Config with the registered groups')
+    fingerprint_parser.set_defaults(func=_fingerprint)
+
+    index_parser = commands.add_parser('index', help='index the sections of an ini or conf file for on demand loading')
+    index_parser.add_argument('config_file', help='the ini or conf file')
+    index_parser.add_argument('-o', '--output', help='the path of the index, default is config_file.idx')
+    index_parser.set_defaults(func=_index)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Generate a python module of typed, slotted classes from the registered
+groups, one class per group:
+
+    oocfg generate --schema myproject.conf:cfg -o myproject/settings.py
+
+    from myproject import settings
+    conf = settings.from_config(cfg)
+    conf.info.name
+
+The options are then plain attributes, read without the __getattr__ of
+ConfigOpts and GroupOpt, and their names and types are checked by mypy.
+The classes are built from the {group: {opt: value}} map, each group in
+one assignment. The imports of the module are private names, so they never
+clash with the class of a group.
+"""
+import keyword
+import re
+from typing import Dict, List
+
+from src.config import exceptions
+from src.config import options
+
+HEADER = '''"""
+Generated by oocfg from the registered groups, do not edit.
+"""
+import typing as _t
+from operator import itemgetter as _itemgetter
+'''
+
+ROOT_CLASS = 'TypedConfig'
+
+_TYPES = [
+    (options.BoolOpt, 'bool'),
+    (options.IntOpt, 'int'),
+    (options.FloatOpt, 'float'),
+    (options.ListOpt, '_t.List[str]'),
+    (options.StrOpt, 'str'),
+]
+
+
+def type_hint(opt: options.Opt) -> str:
+    for opt_type, hint in _TYPES:
+        if isinstance(opt, opt_type):
+            return hint if opt.default is not None else '_t.Optional[%s]' % hint
+    return '_t.Any'
+
+
+def attribute_name(name: str) -> str:
+    """the python name of a group or an option, like my-opt -> my_opt, class -> class_"""
+    name = re.sub(r'\W', '_', name)
+    if not name or name[0].isdigit():
+        name = '_' + name
+    if keyword.iskeyword(name):
+        name += '_'
+    return name
+
+
+def class_name(group: str) -> str:
+    return ''.join(part.capitalize() for part in attribute_name(group).split('_') if part) or 'Group'
+
+
+def _unique(names: List[str], sources: List[str], taken: Dict[str, str] = None) -> List[str]:
+    """raise GeneratedNameConflictError if two sources get the same name"""
+    seen = dict(taken or {})
+    for name, source in zip(names, sources):
+        if name in seen:
+            raise exceptions.GeneratedNameConflictError(name=name, first=seen[name], second=source)
+        seen[name] = source
+    return names
+
+
+def _getter_name(group: str) -> str:
+    return '_%s_values' % attribute_name(group.lower())
+
+
+def _group_source(group_name: str, group: options.GroupOpt) -> List[str]:
+    cls = class_name(group_name)
+    aliases = list(group._opts)
+    attributes = _unique([attribute_name(alias) for alias in aliases],
+                         ['%s.%s' % (group_name, alias) for alias in aliases])
+    lines = ['', '', 'class %s(object):' % cls]
+    lines.append('    __slots__ = %r' % (tuple(attributes),))
+    if attributes:
+        lines.append('')
+    for name, alias in zip(attributes, aliases):
+        lines.append('    %s: %s' % (name, type_hint(group._opts[alias])))
+    lines.append('')
+    lines.append('    def __init__(self, values: _t.Mapping[str, _t.Any]) -> None:')
+    if len(attributes) > 1:
+        lines.append('        %s = %s(values)' % (', '.join('self.%s' % name for name in attributes),
+                                              _getter_name(group_name)))
+    elif attributes:
+        lines.append("        self.%s = values[%r]" % (attributes[0], aliases[0]))
+    else:
+        lines.append('        pass')
+    return lines
+
+
+def generate(conf: options.ConfigOpts) -> str:
+    """
+    :param conf: the ConfigOpts with the registered groups
+    :return: the source of the module
+    """
+    groups: Dict[str, options.GroupOpt] = conf._group
+    _unique([class_name(group_name) for group_name in groups], list(groups),
+            taken={ROOT_CLASS: ROOT_CLASS})
+    lines = [HEADER]
+    for group_name, group in groups.items():
+        if len(group._opts) > 1:
+            lines.append('%s = _itemgetter(%s)' % (_getter_name(group_name),
+                                                  ', '.join(repr(alias) for alias in group._opts)))
+    for group_name, group in groups.items():
+        lines.extend(_group_source(group_name, group))
+
+    attributes = _unique([attribute_name(group_name.lower()) for group_name in groups], list(groups))
+    lines.extend(['', '', 'class %s(object):' % ROOT_CLASS])
+    lines.append('    __slots__ = %r' % (tuple(attributes),))
+    if attributes:
+        lines.append('')
+    for name, group_name in zip(attributes, groups):
+        lines.append('    %s: %s' % (name, class_name(group_name)))
+    lines.append('')
+    lines.append('    def __init__(self, values: _t.Mapping[str, _t.Mapping[str, _t.Any]]) -> None:')
+    for name, group_name in zip(attributes, groups):
+        lines.append('        self.%s = %s(values[%r])' % (name, class_name(group_name), group_name))
+    if not attributes:
+        lines.append('        pass')
+    lines.extend([
+        '', '',
+        'def load(values: _t.Mapping[str, _t.Mapping[str, _t.Any]]) -> %s:' % ROOT_CLASS,
+        '    """build the config from a {GROUP: {opt: value}} map"""',
+        '    return %s(values)' % ROOT_CLASS,
+        '', '',
+        'def from_config(config: _t.Any) -> %s:' % ROOT_CLASS,
+        '    """build the config from the current values of an oocfg Config"""',
+        '    return %s(config.CONF.option_values())' % ROOT_CLASS,
+        '',
+    ])
+    return '\n'.join(lines)
@@ -35,6 +35,46 @@ class ConfigFileNotFoundError(OOCfgException):
     message = "Config file %(file)s does not exist, Please check it!"
 
 
+class ConfigFileFormatError(OOCfgException):
+    message = "Config file %(file)s format error at line %(line)d: %(text)s"
+
+
+class ConfigValidationError(OOCfgException, ValueError):
+    def __init__(self, errors):
+        # [(option name, exception)]
+        self.errors = errors
+        self.message = "%d invalid options: %s" % (
+            len(errors), "; ".join("%s: %s" % (name, error) for name, error in errors))
+
+
+class OverrideValueMissingError(OOCfgException):
+    message = "Override %(flag)s of the command line expects a value!"
+
+
+class ConfigVersionNotFoundError(OOCfgException):
+    message = "Config version %(version)s is not in the history!"
+
+
+class DumpCallbackMissingError(OOCfgException):
+    message = "Access dump every %(interval)s seconds needs a dump callback!"
+
+
+class GeneratedNameConflictError(OOCfgException):
+    message = "Generated name %(name)s is used by both %(first)s and %(second)s!"
+
+
+class SharedConfigBusyError(OOCfgException):
+    message = "Shared config %(name)s is still being published after %(timeout)s seconds, is the master alive?"
+
+
+class InterpolationError(OOCfgException):
+    message = "Can not interpolate option %(name)s: %(reason)s"
+
+
+class InterpolationCycleError(OOCfgException):
+    message = "Options reference each other: %(cycle)s!"
+
+
 class DuplicateOptError(OOCfgException):
     message = "Duplicate Opt Error for %(opt)s!"
 
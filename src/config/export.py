@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Write the effective config, the converted values of every registered
+option, as ini, yaml or json. Groups and options are sorted, so two hosts
+with the same values write the same bytes. The writers are generators of
+text chunks, one option at a time, the config is never built as one string.
+
+    for chunk in export.iter_export(cfg.CONF.option_values(), 'yaml'):
+        stream.write(chunk)
+"""
+import json
+import re
+from typing import Any, Dict, Iterator
+
+from src.config import exceptions
+
+_PLAIN_KEY = re.compile(r'^[A-Za-z_][\w.-]*$')
+
+
+def _sorted(values: Dict[str, Dict[str, Any]]):
+    for group in sorted(values):
+        opts = values[group]
+        yield group, [(alias, opts[alias]) for alias in sorted(opts)]
+
+
+def _ini_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    # a new line is continued by an indented line
+    return str(value).replace('\n', '\n    ')
+
+
+def iter_ini(values: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    first = True
+    for group, opts in _sorted(values):
+        yield '[%s]\n' % group if first else '\n[%s]\n' % group
+        first = False
+        for alias, value in opts:
+            yield '%s = %s\n' % (alias, _ini_value(value))
+
+
+def _yaml_key(key: str) -> str:
+    return key if _PLAIN_KEY.match(key) else json.dumps(key, ensure_ascii=False)
+
+
+def iter_yaml(values: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    # the values are written as json scalars and flow sequences, which yaml reads as they are
+    for group, opts in _sorted(values):
+        if not opts:
+            yield '%s: {}\n' % _yaml_key(group)
+            continue
+        yield '%s:\n' % _yaml_key(group)
+        for alias, value in opts:
+            yield '  %s: %s\n' % (_yaml_key(alias), json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+
+def iter_json(values: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    yield '{'
+    group_separator = '\n'
+    for group, opts in _sorted(values):
+        yield '%s  %s: {' % (group_separator, json.dumps(group, ensure_ascii=False))
+        group_separator = ',\n'
+        separator = '\n'
+        for alias, value in opts:
+            yield '%s    %s: %s' % (separator, json.dumps(alias, ensure_ascii=False),
+                                    json.dumps(value, ensure_ascii=False, sort_keys=True))
+            separator = ',\n'
+        yield '\n  }' if opts else '}'
+    yield '\n}\n'
+
+
+EXPORTERS = {
+    'ini': iter_ini,
+    'yaml': iter_yaml,
+    'json': iter_json,
+}
+
+
+def iter_export(values: Dict[str, Dict[str, Any]], config_format: str = 'json') -> Iterator[str]:
+    """
+    :param values: {group: {opt: value}}, like ConfigOpts.option_values()
+    :param config_format: ini, yaml or json
+    :return: a generator of text chunks
+    """
+    if config_format not in EXPORTERS:
+        raise exceptions.NoSupportType(config_format)
+    return EXPORTERS[config_format](values)
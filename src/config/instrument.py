@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Count the reads of the options of a config.
+
+The groups of an instrumented config are switched to a generated subclass
+of GroupOpt which counts in its __getitem__, and switched back when the
+instrumentation is disabled, so a config which is not instrumented keeps
+the plain access path.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+from src.config.options import ConfigOpts, GroupOpt
+
+LOG = logging.getLogger(__name__)
+
+
+class AccessStats(object):
+    """
+    Read counters of options. With `sample` greater than 1, only one read
+    out of `sample` is counted and weighted by `sample`. Counters are not
+    locked, concurrent reads may be lost, they are estimates.
+    """
+
+    def __init__(self, sample: int = 1):
+        self.sample = max(1, int(sample))
+        self.counts = Counter()  # {(group, opt): reads}
+        self.started = time.time()
+        self._tick = 0
+        self._dumper = None
+        self.group_class = self._make_group_class()
+
+    def _make_group_class(self):
+        stats = self
+        counts = self.counts
+        sample = self.sample
+
+        if sample == 1:
+            def __getitem__(self, opt):
+                value = GroupOpt.__getitem__(self, opt)
+                counts[(self._name, opt)] += 1
+                return value
+        else:
+            def __getitem__(self, opt):
+                value = GroupOpt.__getitem__(self, opt)
+                stats._tick += 1
+                if stats._tick >= sample:
+                    stats._tick = 0
+                    counts[(self._name, opt)] += sample
+                return value
+
+        return type('InstrumentedGroupOpt', (GroupOpt,), {'__slots__': (), '__getitem__': __getitem__})
+
+    def instrument(self, conf: ConfigOpts):
+        for name in list(conf._group):
+            conf._writable_group(name).__class__ = self.group_class
+
+    def uninstrument(self, conf: ConfigOpts):
+        for group in conf._group.values():
+            if type(group) is self.group_class:
+                group.__class__ = GroupOpt
+
+    def reset(self):
+        self.counts.clear()
+        self.started = time.time()
+
+    def report(self, conf: ConfigOpts, top: int = 10) -> dict:
+        """
+        :param conf: the config whose registered options are checked for unused ones
+        :param top: the number of hot options to report
+        :return: {'since': timestamp, 'seconds': float, 'reads': int,
+                  'hot': [{'name', 'reads', 'per_second'}], 'unused': [name]}
+        """
+        seconds = max(time.time() - self.started, 1e-9)
+        counts = dict(self.counts)
+        hot = []
+        for (group, opt), reads in Counter(counts).most_common(top):
+            hot.append({'name': '%s.%s' % (group, opt), 'reads': reads, 'per_second': reads / seconds})
+        unused = []
+        for group_name, group in sorted(conf._group.items()):
+            for alias in sorted(group._opts):
+                if (group._name, alias) not in counts:
+                    unused.append('%s.%s' % (group_name, alias))
+        return {'since': self.started, 'seconds': seconds, 'reads': sum(counts.values()),
+                'hot': hot, 'unused': unused}
+
+    def start_dump(self, interval: float, callback: Callable[[], None]):
+        """call `callback` every `interval` seconds in a daemon thread until `stop_dump`"""
+        self.stop_dump()
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                try:
+                    callback()
+                except Exception:
+                    LOG.exception("Access dump callback failed")
+
+        thread = threading.Thread(target=dump, name='oocfg-access-dump', daemon=True)
+        thread.start()
+        self._dumper = (stop, thread)
+
+    def stop_dump(self):
+        if self._dumper is not None:
+            self._dumper[0].set()
+            self._dumper = None
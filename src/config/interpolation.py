@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Interpolation of ${...} references in defaults and config file values.
+
+    ${GROUP.opt}          the value of opt in GROUP
+    ${opt}                the value of opt in the same group
+    ${env:NAME}           the environment variable NAME
+    ${env:NAME:-default}  the environment variable NAME, or default if unset
+    $$ or \\$              a literal $
+
+A value made of a single reference takes the referenced value as is, like
+a list, otherwise the referenced values are rendered into the string.
+
+Only a value with at least one ${...} reference is a template, the escapes
+are unescaped in templates only. A value without references is taken as it
+is, 'cost$$5' stays cost$$5 and '\\${path}' stays \\${path}, so the values
+written before interpolation existed keep their meaning.
+"""
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from src.config import exceptions
+from src.config.options import ConfigOpts
+
+_REF = re.compile(r'\\\$|\$\$|\$\{([^}]*)\}')
+_ENV = 'env:'
+
+Key = Tuple[str, str]
+
+
+def _split_ref(ref: str, group: str) -> Key:
+    name, dot, opt = ref.strip().partition('.')
+    if not dot:
+        return group, name
+    return name.replace(" ", "").upper(), opt
+
+
+def references(template: str, group: str) -> List[Key]:
+    """the (group, opt) referenced by template, environment variables excluded"""
+    refs = []
+    for match in _REF.finditer(template):
+        ref = match.group(1)
+        if ref is not None and not ref.startswith(_ENV):
+            refs.append(_split_ref(ref, group))
+    return refs
+
+
+def _to_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def render(template: str, group: str, lookup, name: str = None):
+    """
+    :param lookup: called as lookup(group, opt) for the referenced values
+    :return: the interpolated value
+    """
+    def resolve(ref):
+        if ref.startswith(_ENV):
+            env, _, default = ref[len(_ENV):].partition(':-')
+            if env in os.environ:
+                return os.environ[env]
+            if ':-' in ref:
+                return default
+            raise exceptions.InterpolationError(name=name, reason="environment variable %s is not set" % env)
+        return lookup(*_split_ref(ref, group))
+
+    match = _REF.fullmatch(template)
+    if match is not None and match.group(1) is not None:
+        return resolve(match.group(1))
+    return _REF.sub(lambda m: '$' if m.group(1) is None else _to_text(resolve(m.group(1))), template)
+
+
+class Interpolator(object):
+    """
+    The dependency graph of the interpolated options of a config.
+    It is compiled once and only compiled again when a template changes.
+    Resolved values are kept as the current values of the opts, so after
+    a change only the options depending on it are resolved again.
+    """
+
+    def __init__(self):
+        self.templates = {}  # type: Dict[Key, str]
+        self.dependents = {}  # type: Dict[Key, Set[Key]]
+        self.order = []  # type: List[Key]
+
+    def copy(self) -> 'Interpolator':
+        """the graph is never changed in place, so the copy can be compiled again alone"""
+        interpolator = Interpolator()
+        interpolator.templates = self.templates
+        interpolator.dependents = self.dependents
+        interpolator.order = self.order
+        return interpolator
+
+    def compile(self, conf: ConfigOpts):
+        """build the graph of the templates of conf and sort it, raise if a reference is missing or cyclic"""
+        templates = {}
+        dependents = {}
+        for name, group in conf._group.items():
+            for alias, opt in group._opts.items():
+                template = opt.template()
+                if template is None:
+                    continue
+                templates[(name, alias)] = template
+                for ref in references(template, name):
+                    if ref[0] not in conf._group or ref[1] not in conf._group[ref[0]]._opts:
+                        raise exceptions.InterpolationError(name='%s.%s' % (name, alias),
+                                                            reason="no such option %s.%s" % ref)
+                    dependents.setdefault(ref, set()).add((name, alias))
+        self.order = self._sort(templates)
+        self.templates = templates
+        self.dependents = dependents
+
+    @staticmethod
+    def _sort(templates) -> List[Key]:
+        order = []
+        state = {}  # 1 visiting, 2 done
+
+        def visit(key, path):
+            if state.get(key) == 2:
+                return
+            if state.get(key) == 1:
+                cycle = path[path.index(key):] + [key]
+                raise exceptions.InterpolationCycleError(cycle=' -> '.join('%s.%s' % k for k in cycle))
+            state[key] = 1
+            path.append(key)
+            for ref in references(templates[key], key[0]):
+                if ref in templates:
+                    visit(ref, path)
+            path.pop()
+            state[key] = 2
+            order.append(key)
+
+        for key in sorted(templates):
+            visit(key, [])
+        return order
+
+    def _affected(self, seeds) -> Set[Key]:
+        affected = set()
+        stack = list(seeds)
+        while stack:
+            key = stack.pop()
+            for dependent in self.dependents.get(key, ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        return affected | {key for key in seeds if key in self.templates}
+
+    def resolve(self, conf: ConfigOpts, keys=None):
+        """
+        interpolate the templates of conf in dependency order
+        :param keys: only resolve these templates, default is all
+        """
+        def lookup(group, opt):
+            return conf._group[group]._opts[opt].value
+
+        for key in self.order:
+            if keys is not None and key not in keys:
+                continue
+            group, alias = key
+            template = self.templates[key]
+            value = render(template, group, lookup, name='%s.%s' % key)
+            conf._writable_group(group)._writable_opt(alias).set_template_value(template, value)
+
+    def refresh(self, old: ConfigOpts, new: ConfigOpts) -> List[Tuple]:
+        """
+        interpolate the templates of new affected by what changed since old,
+        new is expected to share the unchanged groups and opts with old like
+        the result of `ConfigOpts.update`
+        :return: a list of (group, opt, old, new) for the interpolated values which changed
+        """
+        touched = set()
+        for name, group in new._group.items():
+            old_group = old._group.get(name)
+            if old_group is not None and old_group._opts is group._opts:
+                continue
+            for alias, opt in group._opts.items():
+                if old_group is None or old_group._opts.get(alias) is not opt:
+                    touched.add((name, alias))
+        if not touched:
+            return []
+        if any(key in self.templates or new._group[key[0]]._opts[key[1]].template() is not None
+               for key in touched):
+            self.compile(new)
+        keys = self._affected(touched)
+        self.resolve(new, keys)
+
+        changes = []
+        for group, alias in self.order:
+            if (group, alias) not in keys:
+                continue
+            value = new._group[group]._opts[alias].value
+            old_group = old._group.get(group)
+            old_value = old_group._opts[alias].value if old_group is not None and alias in old_group._opts else None
+            if value != old_value:
+                changes.append((group, alias, old_value, value))
+        return changes
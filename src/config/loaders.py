@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+The registry of the config formats.
+
+A format is detected by the suffix of the file, or by sniffing the first
+bytes of the sources without a known suffix. Each format has backends
+ranked by speed, the first one which can be imported is picked on the first
+use of the format, so an unused format imports nothing.
+
+    loaders.load('/etc/project/config.toml', groups={'INFO'})
+    loaders.load(b'{"info": {"name": "Mike"}}')
+    loaders.register(Loader('properties', ['.properties'], [('builtin', make_parser)]))
+
+A source is a path, bytes or a file object. A backend factory returns a
+parse(source, groups) function, see `Source`.
+"""
+import io
+import os
+import re
+from collections.abc import Mapping
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from src.config import exceptions
+from src.config import utils
+
+SNIFF_SIZE = 512
+
+
+class Source(object):
+    """
+    a config source, the path of a file or its content in memory,
+    a file object is read once into memory
+    """
+    __slots__ = ('path', 'data', 'name')
+
+    def __init__(self, source, name=None):
+        self.path = None
+        self.data = None
+        if isinstance(source, (str, os.PathLike)):
+            self.path = os.fspath(source)
+            if not os.path.exists(self.path):
+                raise exceptions.ConfigFileNotFoundError(file=self.path)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self.data = bytes(source)
+        elif hasattr(source, 'read'):
+            data = source.read()
+            self.data = data.encode('utf-8') if isinstance(data, str) else data
+            name = name or getattr(source, 'name', None)
+        else:
+            raise exceptions.NoSupportType(type(source).__name__)
+        self.name = name or self.path or '<memory>'
+
+    def head(self, size: int = SNIFF_SIZE) -> bytes:
+        if self.data is not None:
+            return self.data[:size]
+        with open(self.path, 'rb') as f:
+            return f.read(size)
+
+    def read_bytes(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def read_text(self) -> str:
+        return self.read_bytes().decode('utf-8')
+
+    def open_text(self):
+        """a text stream of the source, read line by line for a file"""
+        if self.data is not None:
+            return io.StringIO(self.data.decode('utf-8'))
+        return open(self.path, 'r', encoding='utf-8')
+
+
+class Loader(object):
+    """
+    a config format
+    :param name: the name of the format, like json
+    :param suffixes: the suffixes of its files, like ['.json']
+    :param backends: [(name, factory)] from the fastest to the slowest, a factory
+                     imports its backend and returns parse(source, groups)
+    :param sniff: sniff(head) tells whether the first bytes are of this format
+    :param cacheable: whether the parse cache of Config should keep the result
+    """
+
+    def __init__(self, name: str, suffixes: Iterable[str], backends: List[Tuple[str, Callable]],
+                 sniff: Optional[Callable[[bytes], bool]] = None, cacheable: bool = True):
+        self.name = name
+        self.suffixes = tuple(suffixes)
+        self.backends = list(backends)
+        self.sniff = sniff
+        self.cacheable = cacheable
+        self.backend = None  # the name of the picked backend
+        self._parse = None
+
+    def _pick(self):
+        for name, factory in self.backends:
+            try:
+                parse = factory()
+            except ImportError:
+                continue
+            self.backend = name
+            self._parse = parse
+            return parse
+        raise exceptions.NoSupportType("%s, none of its backends %s is installed"
+                                       % (self.name, [name for name, _ in self.backends]))
+
+    def load(self, source, groups=None):
+        """
+        :param source: a path, bytes or a file object, or a Source
+        :param groups: the upper cased names of the groups to keep, None for all
+        :return: {group: {opt: value}}
+        """
+        if not isinstance(source, Source):
+            source = Source(source)
+        parse = self._parse or self._pick()
+        return parse(source, groups)
+
+    def __repr__(self):
+        return "<Loader %s backend=%s>" % (self.name, self.backend)
+
+
+_LOADERS = {}  # {name: Loader}
+_SUFFIXES = {}  # {suffix: Loader}
+
+
+def register(loader: Loader):
+    """register a format, replacing the format of the same name"""
+    old = _LOADERS.pop(loader.name, None)
+    if old is not None:
+        for suffix in old.suffixes:
+            _SUFFIXES.pop(suffix, None)
+    _LOADERS[loader.name] = loader
+    for suffix in loader.suffixes:
+        _SUFFIXES[suffix] = loader
+
+
+def get_loader(name: str) -> Loader:
+    if name not in _LOADERS:
+        raise exceptions.NoSupportType(name)
+    return _LOADERS[name]
+
+
+def suffixes() -> Tuple[str, ...]:
+    return tuple(_SUFFIXES)
+
+
+def detect(source, config_format: str = None) -> Loader:
+    """
+    find the format of a source by its suffix, or by its first bytes
+    :param source: a path, bytes or a Source
+    :param config_format: the name of the format, skips the detection
+    :return: the Loader
+    """
+    if config_format is not None:
+        return get_loader(config_format)
+    if isinstance(source, (str, os.PathLike)):
+        loader = _SUFFIXES.get(os.path.splitext(os.fspath(source))[1].lower())
+        if loader is not None:
+            return loader
+    if not isinstance(source, Source):
+        source = Source(source)
+    head = source.head()
+    for loader in _LOADERS.values():
+        if loader.sniff is not None and loader.sniff(head):
+            return loader
+    raise exceptions.NoSupportType(source.name)
+
+
+def load(source, groups=None, config_format: str = None):
+    """
+    detect the format of a source and load it
+    :param source: a path, bytes or a file object
+    :param groups: the upper cased names of the groups to keep, None for all
+    :param config_format: the name of the format, default is detected
+    :return: {group: {opt: value}}
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        source = Source(source)
+    return detect(source, config_format).load(source, groups)
+
+
+def _sections(data, groups):
+    # keep the sections of the registered groups of a parsed document
+    if data is None:
+        return {}
+    if not isinstance(data, Mapping):
+        raise exceptions.SectionsFormatError()
+    return utils.merge_config_map({}, data, groups=groups)
+
+
+def _first_line(head: bytes) -> str:
+    for line in head.decode('utf-8', 'ignore').splitlines():
+        line = line.strip()
+        if line and line[0] not in '#;':
+            return line
+    return ''
+
+
+# ini and conf
+
+def _ini_stream():
+    def parse(source, groups):
+        with source.open_text() as stream:
+            return utils.parse_ini_stream(stream, groups=groups, source=source.name)
+    return parse
+
+
+_INI_SECTION = re.compile(r'^\[[^\[\]]+\]$')
+
+
+def _sniff_ini(head: bytes) -> bool:
+    return bool(_INI_SECTION.match(_first_line(head)))
+
+
+# yaml
+
+def _yaml_backend(loader_name):
+    def factory():
+        import yaml
+        loader = getattr(yaml, loader_name, None)
+        if loader is None:
+            # CSafeLoader needs pyyaml built with libyaml
+            raise ImportError(loader_name)
+
+        def parse(source, groups):
+            config_map = {}
+            stream = source.data if source.data is not None else source.open_text()
+            try:
+                for document in utils.iter_yaml_documents(stream, loader=loader):
+                    utils.merge_config_map(config_map, document, groups=groups)
+            finally:
+                if stream is not source.data:
+                    stream.close()
+            return config_map
+        return parse
+    return factory
+
+
+_YAML_KEY = re.compile(r'^(---|[\w .-]+:\s*$)')
+
+
+def _sniff_yaml(head: bytes) -> bool:
+    return bool(_YAML_KEY.match(_first_line(head)))
+
+
+# json
+
+def _orjson():
+    import orjson
+    return lambda source, groups: _sections(orjson.loads(source.read_bytes()), groups)
+
+
+def _json():
+    import json
+    return lambda source, groups: _sections(json.loads(source.read_bytes()), groups)
+
+
+def _sniff_json(head: bytes) -> bool:
+    return head.lstrip()[:1] == b'{'
+
+
+# toml
+
+def _tomllib():
+    import tomllib
+    return lambda source, groups: _sections(tomllib.loads(source.read_text()), groups)
+
+
+def _tomli():
+    import tomli
+    return lambda source, groups: _sections(tomli.loads(source.read_text()), groups)
+
+
+# compiled, see Config.compile
+
+def _compiled():
+    def parse(source, groups):
+        if source.path is not None:
+            return utils.load_compiled_config(source.path)
+        return utils.CompiledConfigMap(source.data, source=source.name)
+    return parse
+
+
+def _sniff_compiled(head: bytes) -> bool:
+    return head[:len(utils.COMPILED_MAGIC)] == utils.COMPILED_MAGIC
+
+
+# the order of registration is the order of sniffing
+register(Loader('compiled', [utils.COMPILED_SUFFIX], [('mmap', _compiled)],
+                sniff=_sniff_compiled, cacheable=False))
+register(Loader('json', ['.json'], [('orjson', _orjson), ('json', _json)], sniff=_sniff_json))
+register(Loader('ini', ['.ini'], [('stream', _ini_stream)], sniff=_sniff_ini))
+register(Loader('conf', ['.conf'], [('stream', _ini_stream)]))
+register(Loader('yaml', ['.yaml', '.yml'], [('libyaml', _yaml_backend('CSafeLoader')),
+                                            ('pyyaml', _yaml_backend('SafeLoader'))], sniff=_sniff_yaml))
+register(Loader('toml', ['.toml'], [('tomllib', _tomllib), ('tomli', _tomli)]))
@@ -7,9 +7,15 @@
 
 The module to parse the config file
 """
-from typing import List, Dict, Any
+import copy
+from types import MappingProxyType
+from typing import List, Dict, Any, Tuple
 
 from src.config import exceptions
+from src.config import utils
+
+# marks an opt without a raw value waiting for conversion
+_NOT_SET = object()
 
 
 class Opt(object):
@@ -17,11 +23,15 @@ class Opt(object):
     Opt standard for a config option
     """
 
+    __slots__ = ('_name', 'helper', 'default', '_alias', 'current', '_raw', '_template')
+
     def __init__(self, name: str, default=None, helper='', alias=None, current=None):
         self._name = name.replace(" ", "")
         self.helper = helper
 
-        default = self._validate(default)
+        if not is_ref(default):
+            # a reference is checked once it is interpolated
+            default = self._validate(default)
         self.default = default
 
         if alias is None:
@@ -29,23 +39,47 @@ class Opt(object):
         else:
             self._alias = alias
         self.current = None
+        self._raw = _NOT_SET
+        self._template = None
         if current is not None:
             self._validate(current)
             self.convert_and_set_current(current)
 
-    def _vars_for_cmp(self):
-        v = dict(vars(self))
-        return v
+    def _identity(self) -> tuple:
+        """
+        the declaration of this opt, two opts with the same identity are the
+        same opt whatever their current values are. It is built on demand,
+        keeping it in every opt would cost more memory than the opt itself
+        """
+        return type(self), self._name, self._alias, self.helper, _hashable(self.default)
 
     def __ne__(self, another: Any):
-        return self._vars_for_cmp() != another._vars_for_cmp()
+        return not self.__eq__(another)
 
     def __eq__(self, another: Any):
-        return self._vars_for_cmp() == another._vars_for_cmp()
+        if not isinstance(another, Opt):
+            return NotImplemented
+        return self is another or self._identity() == another._identity()
+
+    def __hash__(self):
+        try:
+            return hash(self._identity())
+        except TypeError:
+            return hash(repr(self._identity()))
 
     def convert_and_set_current(self, current):
         raise NotImplementedError
 
+    def convert(self, current):
+        """
+        convert and validate a value without setting it, raise exception if
+        error. Subclasses only implementing convert_and_set_current are
+        converted on a copy.
+        """
+        opt = copy.copy(self)
+        opt.convert_and_set_current(current)
+        return opt.current
+
     def _validate(self, current):
         # just use to validate the given value, raise exception if error
         # if all is well return True
@@ -53,13 +87,65 @@ class Opt(object):
 
     def _default_is_ref(self):
         """Check if default is a reference to another var."""
-        if isinstance(self.default, str):
-            tmpl = self.default.replace(r'\$', '').replace('$$', '')
-            return '$' in tmpl
-        return False
+        return is_ref(self.default)
+
+    def template(self):
+        """
+        the ${...} template the value of this opt is interpolated from, a
+        template given by the config file wins over a template default
+        :return: the template or None
+        """
+        if self._template is not None:
+            return self._template
+        if self.current is None and self._raw is _NOT_SET and self._default_is_ref():
+            return self.default
+        return None
+
+    def set_template_value(self, template, current):
+        """set the value interpolated from template, see `template`"""
+        self._raw = _NOT_SET
+        self.convert_and_set_current(current)
+        self._template = template
+
+    def set_current(self, current, converted=False, lazy=False):
+        """
+        set the value given by a config file
+        :param current: the value
+        :param converted: the value was already converted by the same type of opt
+        :param lazy: keep the raw value and convert it on the first read of `value`,
+                     with converted, current is a utils.CompiledValue decoded on the first read
+        :return:
+        """
+        self._raw = _NOT_SET
+        self._template = None
+        if converted and lazy:
+            self.current = None
+            self._raw = current
+        elif converted:
+            self.current = current
+        elif is_ref(current):
+            # interpolated later on, see interpolation.Interpolator
+            self.current = None
+            self._template = current
+        elif lazy:
+            self._raw = current
+        else:
+            self.convert_and_set_current(current)
+
+    def validate(self):
+        """convert the raw value kept by a lazy load, raise exception if error"""
+        raw = self._raw
+        if raw is not _NOT_SET:
+            if type(raw) is utils.CompiledValue:
+                self.current = raw.load()
+            else:
+                self.convert_and_set_current(raw)
+            self._raw = _NOT_SET
 
     @property
     def value(self):
+        if self._raw is not _NOT_SET:
+            self.validate()
         if self.current is not None:
             return self.current
         return self.default
@@ -72,8 +158,11 @@ class Opt(object):
 
 
 class StrOpt(Opt):
+    __slots__ = ('choices', '_choice_set')
+
     def __init__(self, name: str, choices: List[str] = None, **kwargs):
         self.choices = self.validate_and_optimize_choices(choices)
+        self._choice_set = frozenset(self.choices) if self.choices else None
         super(StrOpt, self).__init__(name, **kwargs)
 
     @staticmethod
@@ -88,6 +177,9 @@ class StrOpt(Opt):
             parsed.append(choice.replace(" ", ""))
         return parsed
 
+    def _identity(self) -> tuple:
+        return type(self), self._name, self._alias, self.helper, self.default, _hashable(self.choices)
+
     @staticmethod
     def _get_choice_text(choice: str):
         if not choice:
@@ -97,20 +189,25 @@ class StrOpt(Opt):
         else:
             return str(choice)
 
-    def _validate(self, value: str) -> str:
-        value = value.replace(" ", "")
-        if self.choices:
-            if value not in self.choices:
-                raise exceptions.NoSuchChoiceError(name=self._name, choices=self.choices, current=value)
+    def convert(self, value: str) -> str:
+        if value is None:
+            return None
+        value = str(value).replace(" ", "")
+        if self._choice_set is not None and value not in self._choice_set:
+            raise exceptions.NoSuchChoiceError(name=self._name, choices=self.choices, current=value)
         return value
 
+    def _validate(self, value: str) -> str:
+        return self.convert(value)
+
     def convert_and_set_current(self, current: str):
-        """the default type of value from config.ini string, so we do nothing"""
-        self._validate(current)
-        self.current = current.replace(" ", "")
+        """the default type of value from config.ini string, so we only strip the spaces"""
+        self.current = self.convert(current)
 
 
 class ListOpt(Opt):
+    __slots__ = ()
+
     def __init__(self, name: str, **kwargs):
         if 'default' not in kwargs:
             kwargs['default'] = list()
@@ -121,52 +218,50 @@ class ListOpt(Opt):
             raise exceptions.ListTypeError(name=self._name)
         return value
 
-    def convert_and_set_current(self, current: str):
-        if isinstance(current, list):
-            tmp = current
-        else:
-            tmp = current.replace(" ", "").split(",")
+    def convert(self, current: str) -> List[str]:
+        if not isinstance(current, list):
+            current = str(current).replace(" ", "").split(",")
+        # we just convert all the list value to string type
+        return [str(cur) for cur in current]
 
-        current_value = []
-        for cur in tmp:
-            # we just convert all the list value to string type
-            current_value.append(str(cur))
-        self.current = current_value
+    def convert_and_set_current(self, current: str):
+        self.current = self.convert(current)
 
 
 class BoolOpt(Opt):
+    __slots__ = ()
+
     true_values = ['true', '1', 'yes', 'on']
     false_values = ['false', '0', 'no', 'off']
+    _values = dict([(value, True) for value in true_values] + [(value, False) for value in false_values])
 
     def __init__(self, name: str, **kwargs):
         super(BoolOpt, self).__init__(name, **kwargs)
 
-    def _validate(self, value: Any):
+    def convert(self, value: Any) -> bool:
         if isinstance(value, bool):
             return value
-        value = str(str(value).replace(" ", "")).lower()
-        if not (value in self.true_values or value in self.false_values):
+        converted = self._values.get(str(value).replace(" ", "").lower())
+        if converted is None:
             raise exceptions.BoolOptError(name=self._name)
-        if value in self.true_values:
-            return True
-        else:
-            return False
+        return converted
+
+    def _validate(self, value: Any):
+        return self.convert(value)
 
     def convert_and_set_current(self, current: Any):
-        if isinstance(current, bool):
-            self.current = current
-            return
-        current = str(current).replace(" ", "")
-        if str(current).lower() in self.true_values:
-            self.current = True
-        else:
-            self.current = False
+        self.current = self.convert(current)
 
 
 class IntOpt(Opt):
+    __slots__ = ()
+
     def __init__(self, name: str, **kwargs: object):
         super(IntOpt, self).__init__(name, **kwargs)
 
+    def convert(self, current) -> int:
+        return int(current)
+
     def _validate(self, current):
         return int(current)
 
@@ -175,9 +270,14 @@ class IntOpt(Opt):
 
 
 class FloatOpt(Opt):
+    __slots__ = ()
+
     def __init__(self, name, **kwargs):
         super(FloatOpt, self).__init__(name, **kwargs)
 
+    def convert(self, current) -> float:
+        return float(current)
+
     def _validate(self, current):
         return float(current)
 
@@ -186,11 +286,52 @@ class FloatOpt(Opt):
 
 
 class GroupOpt(object):
+    """
+    The opts of a group. A group may share its Opt objects with the groups
+    of other configs, see `share`, its opts are then copied on first write.
+    """
+    __slots__ = ('_name', '_opts', '_owns_opts', '_owned', '_plan', '_fingerprint')
+
     def __init__(self, name: str):
         name = name.replace(" ", "")
         self._name = name
 
         self._opts = {}  # {alias: Opt}
+        self._owns_opts = True  # whether the dict of opts is private
+        self._owned = None  # aliases of the opts this group may change, None for all
+        self._plan = None  # {alias: converter}, see `plan`
+        self._fingerprint = None  # see `fingerprint`, None until computed or after a write
+
+    def share(self) -> 'GroupOpt':
+        """
+        make a group with the same opts. The dict of opts and the opts are
+        shared, and copied by whichever group writes to them first
+        :return: an object of GroupOpt
+        """
+        group = type(self)(self._name)
+        group._opts = self._opts
+        group._owns_opts = False
+        group._owned = set()
+        group._plan = self._plan
+        group._fingerprint = self._fingerprint
+        self._owns_opts = False
+        self._owned = set()
+        return group
+
+    def _own_opts(self):
+        if not self._owns_opts:
+            self._opts = dict(self._opts)
+            self._owns_opts = True
+
+    def _writable_opt(self, alias: str) -> Opt:
+        self._fingerprint = None
+        self._own_opts()
+        opt = self._opts[alias]
+        if self._owned is not None and alias not in self._owned:
+            opt = copy.copy(opt)
+            self._opts[alias] = opt
+            self._owned.add(alias)
+        return opt
 
     def _register_opt(self, opt: Opt) -> bool:
         """
@@ -201,11 +342,17 @@ class GroupOpt(object):
         if _is_opt_registered(self._opts, opt):
             return False
 
+        self._own_opts()
         self._opts[opt._alias] = opt
+        if self._owned is not None:
+            self._owned.add(opt._alias)
+        self._plan = None
+        self._fingerprint = None
         return True
 
     def _unregister_opt(self, opt):
         if opt.alias in self._opts:
+            self._own_opts()
             del self._opts[opt.alias]
 
     def register_opts(self, opts: List[Opt]):
@@ -214,11 +361,110 @@ class GroupOpt(object):
 
     def clear(self):
         self._opts = {}
+        self._owns_opts = True
+        self._plan = None
+        self._fingerprint = None
+
+    def fingerprint(self) -> int:
+        """
+        the XOR of the hashes of the values of the opts, it is kept until an
+        opt of the group is written, and shared with the groups made by `share`
+        :return: a 64 bits int
+        """
+        if self._fingerprint is None:
+            name = self._name.upper()
+            fingerprint = 0
+            for alias, opt in self._opts.items():
+                fingerprint ^= _value_hash(name, alias, opt.value)
+            self._fingerprint = fingerprint
+        return self._fingerprint
+
+    def plan(self) -> Dict[str, Any]:
+        """
+        the validation plan of this group: the converter of every opt,
+        compiled once when the group is first loaded. The converters only
+        depend on the declaration of the opts, so copies of an opt share them.
+        :return: {alias: converter}
+        """
+        if self._plan is None:
+            self._plan = {alias: opt.convert for alias, opt in self._opts.items()}
+        return self._plan
+
+    def apply(self, values, converted: bool = False, lazy: bool = False) -> List[Tuple[str, Exception]]:
+        """
+        convert and set the values of a config file in one batch, the
+        invalid values are skipped and reported together
+        :param values: {alias: value}, values of unregistered opts are ignored
+        :param converted: the values were already converted by the same type of opts
+        :param lazy: keep the raw values and convert them on first access
+        :return: a list of (option name, exception) for the invalid values
+        """
+        plan = self.plan()
+        errors = []
+        # the values of a compiled file are decoded on the first read of each opt
+        compiled = converted and isinstance(values, utils.CompiledGroup)
+        for key in values:
+            converter = plan.get(key)
+            if converter is None:
+                continue
+            if compiled:
+                self._writable_opt(key).set_current(values.ref(key), converted=True, lazy=True)
+                continue
+            value = values[key]
+            if converted or lazy or is_ref(value):
+                self._writable_opt(key).set_current(value, converted=converted, lazy=lazy)
+                continue
+            try:
+                value = converter(value)
+            except (exceptions.OOCfgException, ValueError, TypeError) as e:
+                errors.append(("%s.%s" % (self._name.upper(), key), e))
+                continue
+            self._writable_opt(key).set_current(value, converted=True)
+        return errors
+
+    def copy(self, reset: bool = False) -> 'GroupOpt':
+        """
+        copy this group and its opts, so the values of the copy can be
+        changed without touching this group
+        :param reset: whether to drop the current values of the copied opts
+        :return: an object of GroupOpt
+        """
+        group = type(self)(self._name)
+        for alias, opt in self._opts.items():
+            opt = copy.copy(opt)
+            if reset:
+                opt.set_current(None, converted=True)
+            group._opts[alias] = opt
+        return group
+
+    def freeze(self) -> 'FrozenGroup':
+        """
+        compile the effective values of this group into an immutable object
+        whose options are plain slot attributes
+        :return: an object of FrozenGroup
+        """
+        values = {}
+        for alias, opt in self._opts.items():
+            values[alias] = _freeze_value(opt.value)
+        return _build_frozen(FrozenGroup, self._name.upper(), values)
 
-    def set_opt_value(self, opt: str, current: Any):
+    def set_opt_value(self, opt: str, current: Any, converted: bool = False, lazy: bool = False):
+        """
+        set the value of an opt of this group only, the groups sharing its
+        opts, see `share`, are left untouched
+        """
         if opt.lower() not in self._opts:
             return
-        self._opts[opt].convert_and_set_current(current)
+        self._writable_opt(opt).set_current(current, converted=converted, lazy=lazy)
+
+    def validate_all(self) -> List[Tuple[str, Exception]]:
+        errors = []
+        for alias, opt in self._opts.items():
+            try:
+                opt.validate()
+            except (exceptions.OOCfgException, ValueError, TypeError) as e:
+                errors.append(("%s.%s" % (self._name.upper(), alias), e))
+        return errors
 
     def __getattr__(self, opt: Opt):
         return self.__getitem__(opt)
@@ -237,18 +483,137 @@ class GroupOpt(object):
 
 
 class ConfigOpts(object):
+    """
+    The registered groups of a config. Configs made by `overlay` or
+    `update` share the groups and opts they did not change, every write
+    through a config or one of its groups copies what it changes first, so
+    the values set in one config are never seen by the others.
+    """
+
     def __init__(self):
         self._group = {}
+        self.version = 0  # the version published by Config, 0 before startup
+
+    def overlay(self) -> 'ConfigOpts':
+        """
+        make a config sharing the schema, the defaults and the current
+        values of this one. Each config gets a share of every group, see
+        `GroupOpt.share`, the opts are only copied when they are written.
+        :return: an object of ConfigOpts
+        """
+        conf = ConfigOpts()
+        conf._group = {name: group.share() for name, group in self._group.items()}
+        conf.version = self.version
+        return conf
+
+    def _writable_group(self, name: str) -> GroupOpt:
+        # the groups of a config are never handed to another one, see `overlay`
+        return self._group[name]
+
+    def set_opt_value(self, group: str, opt: str, current: Any):
+        """
+        set the value of an opt of this config only
+        :param group: the name of the group
+        :param opt: the alias of the opt
+        :param current: the value to convert
+        :return:
+        """
+        name = group.replace(" ", "").upper()
+        if name not in self._group:
+            raise exceptions.NoSuchGroup("No such Group %s" % name)
+        if opt not in self._group[name]._opts:
+            raise exceptions.NoSuchOpt(opt)
+        self._writable_group(name).set_opt_value(opt, current)
 
-    def set_config_file_value(self, config_map: Dict[str, Dict[str, str]]):
-        for group, opts in config_map.items():
-            if group.upper() not in self._group:
+    def set_config_file_value(self, config_map: Dict[str, Dict[str, str]], lazy: bool = False,
+                              overrides: Dict[str, Dict[str, str]] = None):
+        """
+        set the values of the registered opts from a config map
+        :param config_map: {group: {opt: value}}
+        :param lazy: keep the raw values and convert them on first access
+        :param overrides: {GROUP: {opt: value}} set over config_map, like the
+                          environment and command line overrides
+        :return:
+        """
+        converted = self._is_converted(config_map)
+        lazy = lazy and not converted
+        overrides = overrides or {}
+        errors = []
+        for name, opts in _normalize_config_map(config_map).items():
+            if name not in self._group:
+                continue
+            registered_group = self._writable_group(name)
+            if name in overrides:
+                opts = {key: opts[key] for key in opts if key not in overrides[name]}
+            errors.extend(registered_group.apply(opts, converted=converted, lazy=lazy))
+        for name, opts in overrides.items():
+            if name in self._group:
+                errors.extend(self._writable_group(name).apply(opts))
+        if errors:
+            raise exceptions.ConfigValidationError(errors)
+
+    def _is_converted(self, config_map) -> bool:
+        """
+        whether config_map holds values already converted by opts of the
+        same types as the registered ones, like a compiled config file
+        """
+        if not isinstance(config_map, utils.CompiledConfigMap):
+            return False
+        for group in config_map:
+            registered_group = self._group.get(group)
+            if registered_group is None:
                 continue
-            registered_group = self._get_group(group, from_file=True)
-            if not isinstance(opts, dict):
-                opts = dict(opts)
-            for opt_name, opt_value in opts.items():
-                registered_group.set_opt_value(opt_name, opt_value)
+            compiled_group = config_map[group]
+            for opt_name in compiled_group:
+                opt = registered_group._opts.get(opt_name)
+                if opt is not None and type(opt).__name__ != compiled_group.type_of(opt_name):
+                    return False
+        return True
+
+    def validate_all(self):
+        """convert and validate all the values kept raw by a lazy load, report all the errors at once"""
+        errors = []
+        for group in self._group.values():
+            errors.extend(group.validate_all())
+        if errors:
+            raise exceptions.ConfigValidationError(errors)
+
+    def effective_values(self) -> Dict[str, Dict[str, Tuple[str, Any]]]:
+        """
+        collect the effective values of all the registered opts
+        :return: {group: {opt: (type name, value)}}
+        """
+        values = {}
+        for name, group in self._group.items():
+            values[name] = {}
+            for alias, opt in group._opts.items():
+                values[name][alias] = (type(opt).__name__, opt.value)
+        return values
+
+    def option_values(self) -> Dict[str, Dict[str, Any]]:
+        """
+        collect the values of all the registered opts
+        :return: {group: {opt: value}}
+        """
+        return {name: {alias: opt.value for alias, opt in group._opts.items()}
+                for name, group in self._group.items()}
+
+    def converted_values(self, config_map) -> Dict[str, Dict[str, Tuple[str, Any]]]:
+        """
+        collect the converted values of the registered opts given in config_map
+        :return: {group: {opt: (type name, value)}}
+        """
+        values = {}
+        for group, opts in _normalize_config_map(config_map).items():
+            registered_group = self._group.get(group)
+            if registered_group is None:
+                continue
+            values[group] = {}
+            for opt_name in opts:
+                opt = registered_group._opts.get(opt_name)
+                if opt is not None:
+                    values[group][opt_name] = (type(opt).__name__, opt.value)
+        return values
 
     def register_opts(self, group: str, opts):
         registered_group = self._get_group(group)
@@ -276,6 +641,238 @@ class ConfigOpts(object):
     def __getattr__(self, group):
         return self.__getitem__(group)
 
+    def update(self, config_map: Dict[str, Dict[str, str]],
+               previous: Dict[str, Dict[str, str]] = None,
+               overrides: Dict[str, Dict[str, str]] = None) -> Tuple['ConfigOpts', List[Tuple]]:
+        """
+        build a new ConfigOpts with config_map applied.
+        Only the options whose value in config_map differs from `previous`,
+        the map this ConfigOpts was loaded from, are converted again. The
+        other groups and opts are shared with this ConfigOpts, which is
+        left untouched.
+        :param config_map: the new config map
+        :param previous: the config map currently applied
+        :param overrides: {GROUP: {opt: value}} set over both maps, their options are kept
+        :return: the new ConfigOpts and a list of (group, opt, old, new)
+                 for every option whose effective value changed
+        """
+        converted = self._is_converted(config_map)
+        config_map = _normalize_config_map(config_map)
+        previous = _normalize_config_map(previous or {})
+        overrides = overrides or {}
+        conf = self.overlay()
+        changes = []
+        errors = []
+        for name, group in self._group.items():
+            new_opts = config_map.get(name, {})
+            old_opts = previous.get(name, {})
+            if new_opts == old_opts:
+                continue
+            values = {}
+            removed = []
+            overridden = overrides.get(name, ())
+            for key in set(new_opts) | set(old_opts):
+                if key not in group._opts or key in overridden:
+                    continue
+                if key in new_opts and key in old_opts and new_opts[key] == old_opts[key]:
+                    continue
+                if key in new_opts:
+                    values[key] = new_opts[key]
+                else:
+                    removed.append(key)
+            if not values and not removed:
+                continue
+            updated = conf._writable_group(name)
+            errors.extend(updated.apply(values, converted=converted))
+            for key in removed:
+                updated._writable_opt(key).set_current(None, converted=True)
+            for key in list(values) + removed:
+                old_opt, new_opt = group._opts[key], updated._opts[key]
+                # the changes of interpolated values are found by the interpolation
+                if new_opt is old_opt or new_opt.template() is not None:
+                    continue
+                old_value = _old_value(old_opt)
+                if new_opt.value != old_value:
+                    changes.append((name, key, old_value, new_opt.value))
+        if errors:
+            raise exceptions.ConfigValidationError(errors)
+        return conf, changes
+
+    def diff(self, previous: 'ConfigOpts') -> List[Tuple]:
+        """
+        the options whose value differs from previous, the groups and opts
+        shared with previous are skipped without comparing their values
+        :return: a list of (group, opt, old, new)
+        """
+        changes = []
+        for name, group in self._group.items():
+            old_group = previous._group.get(name)
+            if old_group is None or old_group._opts is group._opts:
+                continue
+            for alias, opt in group._opts.items():
+                old_opt = old_group._opts.get(alias)
+                if old_opt is None or old_opt is opt:
+                    continue
+                old_value = _old_value(old_opt)
+                if old_value != opt.value:
+                    changes.append((name, alias, old_value, opt.value))
+        return changes
+
+    def fingerprint(self) -> str:
+        """
+        a stable hash of the effective values, equal for two configs with the
+        same values whatever their files. Only the groups written since the
+        last call are hashed again, the unchanged groups reuse their hash.
+        :return: 16 hex digits
+        """
+        fingerprint = 0
+        for group in self._group.values():
+            fingerprint ^= group.fingerprint()
+        return '%016x' % fingerprint
+
+    def copy(self, reset: bool = False) -> 'ConfigOpts':
+        conf = ConfigOpts()
+        for name, group in self._group.items():
+            conf._group[name] = group.copy(reset=reset)
+        return conf
+
+    def freeze(self) -> 'FrozenConfig':
+        """
+        compile all the registered groups into an immutable snapshot.
+        Reading an option from the snapshot is a plain attribute load,
+        the snapshot does not follow later changes of the config.
+        :return: an object of FrozenConfig
+        """
+        groups = {}
+        for name, group in self._group.items():
+            groups[name] = group.freeze()
+        # snapshot.info works like CONF.info
+        aliases = {name.lower(): name for name in groups if name.lower() not in groups}
+        return _build_frozen(FrozenConfig, 'FrozenConfig', groups, aliases=aliases)
+
+
+class _Frozen(object):
+    """
+    Base of the compiled snapshot classes, every key is a slot of the
+    generated subclass and all the keys are kept in `_values` as well
+    for the item access.
+    """
+    __slots__ = ('_values',)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("%s is read only" % type(self).__name__)
+
+    def __delattr__(self, key):
+        raise AttributeError("%s is read only" % type(self).__name__)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, dict(self._values))
+
+
+class FrozenGroup(_Frozen):
+    __slots__ = ()
+
+    def __getitem__(self, opt: str):
+        if opt not in self._values:
+            raise exceptions.NoSuchOpt(opt)
+        return self._values[opt]
+
+
+class FrozenConfig(_Frozen):
+    __slots__ = ()
+
+    def __getitem__(self, group: str) -> FrozenGroup:
+        group = group.replace(" ", "").upper()
+        if group not in self._values:
+            raise exceptions.NoSuchGroup("No such Group %s" % group)
+        return self._values[group]
+
+
+def is_ref(value) -> bool:
+    """
+    Check if value is a string referencing other vars like ${GROUP.opt}.
+    Escaped references do not count, the escapes of a value which is not a
+    reference are kept as they are.
+    """
+    if isinstance(value, str) and '$' in value:
+        tmpl = value.replace(r'\$', '').replace('$$', '')
+        return '${' in tmpl
+    return False
+
+
+def _hashable(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _value_hash(group: str, alias: str, value: Any) -> int:
+    import hashlib
+    key = "%s.%s=%s:%r" % (group, alias, type(value).__name__, value)
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _old_value(opt: Opt):
+    # a raw value of a lazy load which was never read may be invalid,
+    # the reload fixing it compares with the raw value
+    try:
+        return opt.value
+    except (exceptions.OOCfgException, ValueError, TypeError):
+        return opt._raw
+
+
+def _normalize_config_map(config_map) -> Dict[str, Dict[str, Any]]:
+    """
+    :return: {GROUP: {opt: value}}, the groups whose names only differ by case
+             are merged in order, the top level values which are not groups are dropped
+    """
+    normalized = {}
+    for group, opts in config_map.items():
+        opts = utils._options(opts)
+        if opts is None or not isinstance(group, str):
+            continue
+        name = utils._section_key(group)
+        if name in normalized:
+            merged = dict(normalized[name])
+            merged.update(opts)
+            opts = merged
+        normalized[name] = opts
+    return normalized
+
+
+def _build_frozen(base, name: str, values: Dict[str, Any], aliases: Dict[str, str] = None):
+    """:param aliases: {attribute: key}, more attributes for the values of some keys"""
+    attributes = dict((key, key) for key in values)
+    attributes.update(aliases or {})
+    slots = tuple(key for key in attributes if key.isidentifier() and not hasattr(base, key))
+    cls = type(name, (base,), {'__slots__': slots})
+    frozen = object.__new__(cls)
+    object.__setattr__(frozen, '_values', MappingProxyType(values))
+    for key in slots:
+        object.__setattr__(frozen, key, values[attributes[key]])
+    return frozen
+
+
+def _freeze_value(value):
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
 
 def _is_opt_registered(opts: Dict[str, Opt], opt: Opt):
     """Check whether an opt with the same name is already registered.
@@ -290,7 +887,8 @@ def _is_opt_registered(opts: Dict[str, Opt], opt: Opt):
     :raises: DuplicateOptError if a naming conflict is detected
     """
     if opt._alias in opts:
-        if opts[opt._alias] != opt:
+        registered = opts[opt._alias]
+        if registered is not opt and registered._identity() != opt._identity():
             raise exceptions.DuplicateOptError(opt=opt._name)
         return True
     else:
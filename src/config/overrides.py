@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Override the options of the config files from the environment and the
+command line.
+
+    OOCFG_INFO__NAME=Mike           # prefix, group, '__', option
+    --info-name Mike / --info-name=Mike
+
+The names of every registered option are indexed once, then the
+environment and argv are matched in a single scan with one dict lookup
+per entry. The options are never looked up in the environment when read.
+"""
+import argparse
+import os
+from typing import Dict, List
+
+from src.config import exceptions
+from src.config.options import BoolOpt, ConfigOpts
+
+DEFAULT_PREFIX = 'OOCFG_'
+SEPARATOR = '__'
+
+
+class OverrideIndex(object):
+    """
+    the override names of the options registered in a ConfigOpts,
+    options registered later are not indexed
+    """
+
+    def __init__(self, conf: ConfigOpts, prefix: str = DEFAULT_PREFIX):
+        self.prefix = prefix
+        self.env = {}  # {OOCFG_INFO__NAME: (group, opt)}
+        self.flags = {}  # {--info-name: (group, opt)}
+        self.opts = {}  # {(group, opt): Opt}
+        for group_name, group in conf._group.items():
+            for alias, option in group._opts.items():
+                key = (group_name, alias)
+                self.env[self.env_name(group_name, alias)] = key
+                self.flags[self.flag_name(group_name, alias)] = key
+                self.opts[key] = option
+
+    def env_name(self, group: str, alias: str) -> str:
+        return "%s%s%s%s" % (self.prefix, group.upper(), SEPARATOR, alias.upper())
+
+    @staticmethod
+    def flag_name(group: str, alias: str) -> str:
+        return "--%s-%s" % (group.lower().replace('_', '-'), alias.lower().replace('_', '-'))
+
+    @staticmethod
+    def dest(group: str, alias: str) -> str:
+        return "%s%s%s" % (group, SEPARATOR, alias)
+
+    def match_environ(self, environ=None) -> Dict[str, Dict[str, str]]:
+        """
+        :param environ: default is os.environ
+        :return: {GROUP: {opt: value}} of the variables naming an option
+        """
+        if environ is None:
+            environ = os.environ
+        prefix = self.prefix
+        index = self.env
+        overrides = {}
+        for name, value in environ.items():
+            if not name.startswith(prefix):
+                continue
+            key = index.get(name)
+            if key is not None:
+                overrides.setdefault(key[0], {})[key[1]] = value
+        return overrides
+
+    def match_argv(self, argv: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        match --group-opt value and --group-opt=value, the other arguments
+        are left to the program. A bool option given without value is true.
+        :param argv: the arguments without the program, like sys.argv[1:]
+        :return: {GROUP: {opt: value}}
+        """
+        index = self.flags
+        overrides = {}
+        i = 0
+        while i < len(argv):
+            flag, equal, value = argv[i].partition('=')
+            i += 1
+            key = index.get(flag)
+            if key is None:
+                continue
+            if not equal:
+                if i < len(argv) and not argv[i].startswith('--'):
+                    value = argv[i]
+                    i += 1
+                elif isinstance(self.opts[key], BoolOpt):
+                    value = 'true'
+                else:
+                    raise exceptions.OverrideValueMissingError(flag=flag)
+            overrides.setdefault(key[0], {})[key[1]] = value
+        return overrides
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        """
+        add a --group-opt argument for every option to the parser, one
+        argument group per config group, the helper of the option is the help
+        """
+        groups = {}
+        for (group_name, alias), option in self.opts.items():
+            arg_group = groups.get(group_name)
+            if arg_group is None:
+                arg_group = groups[group_name] = parser.add_argument_group(group_name)
+            kwargs = {}
+            if isinstance(option, BoolOpt):
+                kwargs.update(nargs='?', const='true')
+            help_text = option.helper or ''
+            if option.default is not None:
+                help_text = "%s (default: %s)" % (help_text, option.default) if help_text else \
+                    "default: %s" % option.default
+            arg_group.add_argument(self.flag_name(group_name, alias), dest=self.dest(group_name, alias),
+                                   metavar=alias.upper(), default=argparse.SUPPRESS,
+                                   help=help_text.replace('%', '%%'), **kwargs)
+
+    def match_namespace(self, namespace: argparse.Namespace) -> Dict[str, Dict[str, str]]:
+        """
+        :param namespace: parsed by a parser given to `add_arguments`
+        :return: {GROUP: {opt: value}} of the arguments given
+        """
+        given = vars(namespace)
+        overrides = {}
+        for group_name, alias in self.opts:
+            dest = self.dest(group_name, alias)
+            if dest in given:
+                overrides.setdefault(group_name, {})[alias] = given[dest]
+        return overrides
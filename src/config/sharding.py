@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Sharded config stores, for a central config holding the sections of every
+service when each process only registers a few groups.
+
+    a directory with one file per group: store/info.ini, store/server.yaml
+    an ini or conf file with an index of the byte ranges of its sections,
+    built by `build_index` (oocfg index config.ini) into config.ini.idx
+
+A config started from a store loads none of its groups at startup. The
+ConfigOpts is switched to LazyConfigOpts, which parses and sets a group the
+first time __getitem__ asks for it, and switches back to ConfigOpts once
+every group of the store is loaded. The groups referenced by ${GROUP.opt}
+templates are loaded at startup, so the templates see the store values.
+"""
+import io
+import logging
+import marshal
+import os
+import struct
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import exceptions
+from src.config import interpolation
+from src.config import loaders
+from src.config import utils
+from src.config.options import ConfigOpts
+
+LOG = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'OOIX'
+INDEX_VERSION = 1
+# magic, version, reserved
+_INDEX_HEADER = struct.Struct('<4sHH')
+
+Ranges = List[Tuple[int, int]]
+
+
+def scan_sections(config_file) -> Dict[str, Ranges]:
+    """
+    find the byte ranges of the sections of an ini or conf file in one pass
+    :return: {section key: [(offset, length)]}, DEFAULT is kept as DEFAULT
+    """
+    sections = {}
+    current = None
+    start = offset = 0
+    with open(config_file, 'rb') as f:
+        for line in f:
+            if line[:1] == b'[':
+                end = line.find(b']')
+                if end > 0:
+                    if current is not None:
+                        sections.setdefault(current, []).append((start, offset - start))
+                    name = line[1:end].strip().decode('utf-8')
+                    current = name if name == 'DEFAULT' else utils._section_key(name)
+                    start = offset
+            offset += len(line)
+    if current is not None:
+        sections.setdefault(current, []).append((start, offset - start))
+    return sections
+
+
+def _file_state(config_file) -> Tuple[int, int]:
+    stat = os.stat(config_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(config_file, output=None) -> str:
+    """
+    write the index of the sections of an ini or conf file
+    :param config_file: the path of the file
+    :param output: the path of the index, default is config_file + .idx
+    :return: the path of the index
+    """
+    if not os.path.exists(config_file):
+        raise exceptions.ConfigFileNotFoundError(file=config_file)
+    state = _file_state(config_file)
+    index = {'size': state[0], 'mtime_ns': state[1], 'sections': scan_sections(config_file)}
+    output = output or config_file + INDEX_SUFFIX
+    utils._write_atomic(output, [_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0), marshal.dumps(index)])
+    return output
+
+
+def read_index(index_file) -> Optional[Dict[str, Any]]:
+    """:return: the index, None if it is missing or not an index"""
+    try:
+        with open(index_file, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _INDEX_HEADER.size:
+        return None
+    magic, version, _ = _INDEX_HEADER.unpack_from(data, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        return None
+    return marshal.loads(data[_INDEX_HEADER.size:])
+
+
+class IndexedFileStore(object):
+    """
+    an ini or conf file read section by section through its index.
+    A missing or stale index is rebuilt in memory, without writing it.
+    """
+
+    def __init__(self, config_file, index_file=None):
+        if not os.path.exists(config_file):
+            raise exceptions.ConfigFileNotFoundError(file=config_file)
+        self.path = config_file
+        self.index_file = index_file or config_file + INDEX_SUFFIX
+        self.state = None
+        self.sections = {}  # {section key: [(offset, length)]}
+        self._warned = False  # the missing or stale index is only logged once
+        self.refresh()
+
+    def refresh(self):
+        """read the index again, the file may have changed"""
+        state = _file_state(self.path)
+        index = read_index(self.index_file)
+        if index is None or (index['size'], index['mtime_ns']) != state:
+            if not self._warned:
+                LOG.warning("The index of %s is missing or stale, scanning the file, "
+                            "run `oocfg index %s` to build it", self.path, self.path)
+                self._warned = True
+            sections = scan_sections(self.path)
+        else:
+            sections = index['sections']
+        self.sections = sections
+        self.state = state
+
+    def groups(self):
+        return self.sections.keys()
+
+    def load_group(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        :param name: the upper cased name of the group
+        :return: {opt: value} of its sections, None if the store has no such group
+        """
+        ranges = self.sections.get(name)
+        if not ranges:
+            return None
+        if _file_state(self.path) != self.state:
+            self.refresh()
+            return self.load_group(name)
+        chunks = []
+        with open(self.path, 'rb') as f:
+            for offset, length in self.sections.get('DEFAULT', []) + ranges:
+                f.seek(offset)
+                chunks.append(f.read(length))
+        text = b''.join(chunks).decode('utf-8')
+        config_map = utils.parse_ini_stream(io.StringIO(text), groups={name}, source=self.path)
+        values = {}
+        for opts in config_map.values():
+            values.update(opts)
+        return values
+
+
+class DirectoryStore(object):
+    """a directory with one file of a registered format per group, named after the group"""
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise exceptions.ConfigFileNotFoundError(file=directory)
+        self.path = directory
+        self.files = {}  # {group key: path}
+        self.refresh()
+
+    def refresh(self):
+        files = {}
+        for path in utils.list_config_dir(self.path, suffixes=loaders.suffixes()):
+            name = os.path.splitext(os.path.basename(path))[0]
+            files[utils._section_key(name)] = path
+        self.files = files
+
+    def groups(self):
+        return self.files.keys()
+
+    def load_group(self, name: str) -> Optional[Dict[str, Any]]:
+        path = self.files.get(name)
+        if path is None:
+            return None
+        values = {}
+        for opts in loaders.load(path, groups={name}).values():
+            values.update(opts)
+        return values
+
+
+def open_store(path):
+    """:param path: a directory for DirectoryStore, or the ini or conf file of IndexedFileStore"""
+    if os.path.isdir(path):
+        return DirectoryStore(path)
+    return IndexedFileStore(path)
+
+
+class LazyConfigOpts(ConfigOpts):
+    """
+    A ConfigOpts whose groups are loaded from a store on first access.
+    The configs made by overlay or update keep the groups not loaded yet
+    pending and load them on their own.
+    """
+
+    def _load_group(self, name: str):
+        with self._load_lock:
+            store = self._pending.get(name)
+            if store is None:
+                # loaded by another thread
+                return
+            values = store.load_group(name) or {}
+            overridden = self._overrides.get(name, ())
+            values = {key: value for key, value in values.items() if key not in overridden}
+            errors = self._writable_group(name).apply(values)
+            if errors:
+                raise exceptions.ConfigValidationError(errors)
+            del self._pending[name]
+            if not self._pending:
+                self.__class__ = ConfigOpts
+            if self._on_load is not None:
+                self._on_load(self, name, values)
+
+    def load_all(self):
+        """load every group not loaded yet"""
+        for name in list(self._pending):
+            self._load_group(name)
+
+    def __getitem__(self, group):
+        name = group.replace(" ", "").upper()
+        if name in self._pending:
+            self._load_group(name)
+        return ConfigOpts.__getitem__(self, name)
+
+    def overlay(self) -> ConfigOpts:
+        conf = ConfigOpts.overlay(self)
+        if self._pending:
+            _defer(conf, dict(self._pending), self._overrides, self._on_load)
+        return conf
+
+    def option_values(self):
+        self.load_all()
+        return ConfigOpts.option_values(self)
+
+    def effective_values(self):
+        self.load_all()
+        return ConfigOpts.effective_values(self)
+
+    def converted_values(self, config_map):
+        self.load_all()
+        return ConfigOpts.converted_values(self, config_map)
+
+    def validate_all(self):
+        self.load_all()
+        return ConfigOpts.validate_all(self)
+
+    def fingerprint(self):
+        self.load_all()
+        return ConfigOpts.fingerprint(self)
+
+    def freeze(self):
+        self.load_all()
+        return ConfigOpts.freeze(self)
+
+
+def pending_groups(conf: ConfigOpts) -> Dict[str, Any]:
+    """:return: {group: store} of the groups of conf not loaded yet"""
+    return conf.__dict__.get('_pending') or {}
+
+
+def load_references(conf: ConfigOpts, templates: Dict[Tuple[str, str], str]):
+    """
+    load the pending groups referenced by templates, so that they are
+    interpolated from the values of the store rather than the defaults
+    :param templates: {(group, opt): template}
+    """
+    for (group, _), template in list(templates.items()):
+        for name, _ in interpolation.references(template, group):
+            if name in pending_groups(conf):
+                conf[name]
+
+
+def copy_groups(conf: ConfigOpts, source: ConfigOpts, names):
+    """
+    set the groups of source in conf, they are no longer pending in conf
+    :param names: the names of the groups
+    """
+    lock = conf.__dict__.get('_load_lock') or threading.RLock()
+    with lock:
+        pending = pending_groups(conf)
+        for name in names:
+            conf._group[name] = source._group[name].share()
+            pending.pop(name, None)
+        if type(conf) is LazyConfigOpts and not pending:
+            conf.__class__ = ConfigOpts
+
+
+def _defer(conf: ConfigOpts, pending, overrides, on_load):
+    conf._pending = pending
+    conf._overrides = overrides
+    conf._on_load = on_load
+    conf._load_lock = threading.RLock()
+    conf.__class__ = LazyConfigOpts
+
+
+def defer(conf: ConfigOpts, store, overrides: Dict[str, Dict[str, Any]] = None,
+          on_load: Callable[[ConfigOpts, str, Dict[str, Any]], None] = None):
+    """
+    load the registered groups of conf found in store on their first access
+    :param conf: the ConfigOpts, switched to LazyConfigOpts
+    :param store: the store, see `open_store`
+    :param overrides: {GROUP: {opt: value}}, the opts which are not set from the store
+    :param on_load: called as on_load(conf, group, values) after a group is loaded
+    :return:
+    """
+    pending = {name: store for name in conf._group if name in store.groups()}
+    if pending:
+        _defer(conf, pending, overrides or {}, on_load)
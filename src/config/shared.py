@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+Share the effective config of a master process with its pre-forked workers.
+
+The master encodes the values in the compiled format of `utils` into a
+shared memory segment. A small control segment holds a generation counter
+and the name of the current data segment, workers attach read-only and
+check the generation on every group access.
+"""
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict
+
+from src.config import exceptions
+from src.config import utils
+
+# generation, size of data, name of data segment
+_CONTROL = struct.Struct('<QQ64s')
+_GENERATION = struct.Struct('<Q')
+# a reader waits this long for a publish to complete before giving up
+PUBLISH_TIMEOUT = 5.0
+_RETRY_SLEEP = 0.001
+# resource_tracker.register is replaced for the whole process while attaching
+_ATTACH_LOCK = threading.Lock()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # python < 3.13 always tracks an attached segment and unlinks it when
+    # the worker exits, but the master owns it
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedConfigPublisher(object):
+    """The master side, owns the control and the data segments"""
+
+    def __init__(self, name: str = None):
+        self.name = name or 'oocfg_%d' % os.getpid()
+        self._control = shared_memory.SharedMemory(name=self.name, create=True, size=_CONTROL.size)
+        _CONTROL.pack_into(self._control.buf, 0, 0, 0, b'')
+        self._data = None
+        self.generation = 0
+
+    def publish(self, values):
+        """
+        publish a new version of the config
+        :param values: {group: {opt: (type name, value)}}
+        :return: the new generation
+        """
+        data = b''.join(utils.dump_compiled_config(values))
+        generation = self.generation + 2
+        segment = shared_memory.SharedMemory(name='%s_%d' % (self.name, generation),
+                                             create=True, size=len(data))
+        segment.buf[:len(data)] = data
+        # seqlock: an odd generation tells readers the control is being written
+        _GENERATION.pack_into(self._control.buf, 0, generation - 1)
+        _CONTROL.pack_into(self._control.buf, 0, generation - 1, len(data), segment.name.encode())
+        _GENERATION.pack_into(self._control.buf, 0, generation)
+        self.generation = generation
+
+        # workers still attached to the old segment keep their mapping
+        if self._data is not None:
+            self._data.close()
+            self._data.unlink()
+        self._data = segment
+        return generation
+
+    def close(self):
+        for segment in (self._data, self._control):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self._data = None
+        self._control = None
+
+
+class SharedGroup(object):
+    """A read-only group of the shared config"""
+
+    __slots__ = ('_name', '_values')
+
+    def __init__(self, name, values: utils.CompiledGroup):
+        self._name = name
+        self._values = values
+
+    def __getattr__(self, opt):
+        return self.__getitem__(opt)
+
+    def __getitem__(self, opt):
+        if opt not in self._values:
+            raise exceptions.NoSuchOpt(opt)
+        return self._values[opt]
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class SharedConfigOpts(object):
+    """
+    The worker side, used in place of ConfigOpts. The values are decoded
+    from the shared pages on first access and the generation is checked on
+    every group access, so a reload of the master is seen at once.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._control = _attach(name)
+        self._data = None
+        self._buffer = None
+        self._config_map = None
+        self._groups = {}
+        self.generation = None
+        self.version = None  # the versions of the master are not shared
+        self._refresh()
+
+    def _read_control(self):
+        deadline = None
+        while True:
+            generation = _GENERATION.unpack_from(self._control.buf, 0)[0]
+            if not generation % 2:
+                _, size, segment = _CONTROL.unpack_from(self._control.buf, 0)
+                if _GENERATION.unpack_from(self._control.buf, 0)[0] == generation:
+                    return generation, size, segment.rstrip(b'\0').decode()
+            # the master is publishing, or died while publishing
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + PUBLISH_TIMEOUT
+            elif now > deadline:
+                raise exceptions.SharedConfigBusyError(name=self.name, timeout=PUBLISH_TIMEOUT)
+            time.sleep(_RETRY_SLEEP)
+
+    def _refresh(self):
+        while True:
+            generation, size, segment = self._read_control()
+            if not segment:
+                raise exceptions.GroupNoRegistered()
+            try:
+                data = _attach(segment)
+            except FileNotFoundError:
+                # the master published again in the meantime
+                continue
+            break
+        self._release()
+        self._data = data
+        self._buffer = data.buf[:size].toreadonly()
+        self._config_map = utils.CompiledConfigMap(self._buffer, source=segment)
+        self._groups = {}
+        self.generation = generation
+
+    def _release(self):
+        # groups handed out before keep the old pages alive until they are
+        # dropped, so do not release the views under them
+        self._config_map = None
+        self._groups = {}
+        self._buffer = None
+        if self._data is not None:
+            try:
+                self._data.close()
+            except BufferError:
+                pass
+            self._data = None
+
+    def close(self):
+        self._release()
+        self._control.close()
+
+    def option_values(self) -> Dict[str, Dict[str, Any]]:
+        """the values of all the groups, {group: {opt: value}}"""
+        if _GENERATION.unpack_from(self._control.buf, 0)[0] != self.generation:
+            self._refresh()
+        return {group: dict(values) for group, values in self._config_map.items()}
+
+    def __getitem__(self, group) -> SharedGroup:
+        if _GENERATION.unpack_from(self._control.buf, 0)[0] != self.generation:
+            self._refresh()
+        group = group.replace(" ", "").upper()
+        if group not in self._groups:
+            if group not in self._config_map:
+                raise exceptions.NoSuchGroup("No such Group %s" % group)
+            self._groups[group] = SharedGroup(group, self._config_map[group])
+        return self._groups[group]
+
+    def __getattr__(self, group):
+        return self.__getitem__(group)
@@ -3,15 +3,30 @@
 
 """
 @Author  : lex(luohai2233@163.com)
+
+The backends of the formats (yaml, configparser) and of the parse cache are
+imported on first use, a program reading only ini files or the defaults
+never imports yaml.
 """
+import marshal
+import mmap
 import os
-
-import configparser
-import yaml
+import struct
+import sys
+from collections.abc import Mapping
 
 from src.config import exceptions
 
 
+COMPILED_SUFFIX = '.oocc'
+CONFIG_SUFFIXES = ('.ini', '.yaml', '.conf')
+COMPILED_MAGIC = b'OOCF'
+COMPILED_VERSION = 2
+# magic, version, python major and minor version, length of index.
+# marshal is only stable within a python version, so it is recorded
+_COMPILED_HEADER = struct.Struct('<4sHBBI')
+
+
 def get_config_file_type(config_file):
     if config_file.endswith('.ini'):
         return 'ini'
@@ -19,6 +34,8 @@ def get_config_file_type(config_file):
         return 'yaml'
     elif config_file.endswith('.conf'):
         return 'conf'
+    elif config_file.endswith(COMPILED_SUFFIX):
+        return 'compiled'
     else:
         raise exceptions.NoSupportType(config_file.split('.')[-1])
 
@@ -27,6 +44,7 @@ def load_ini_cofing(config_file):
     config_map = {}
     if not os.path.exists(config_file):
         raise exceptions.ConfigFileNotFoundError(file=config_file)
+    import configparser
     config_parser = configparser.ConfigParser()
     config_parser.read(config_file, encoding='utf-8')
 
@@ -36,19 +54,408 @@ def load_ini_cofing(config_file):
     return config_map
 
 
-def load_yaml_config(config_file):
-    config = []
+def list_config_dir(config_dir, suffixes=CONFIG_SUFFIXES):
+    """
+    list the supported config files of a conf.d directory, sorted by name
+    :param config_dir: the path of the directory
+    :param suffixes: the suffixes of the supported files, see `loaders.suffixes`
+    :return: the list of paths
+    """
+    if not os.path.isdir(config_dir):
+        raise exceptions.ConfigFileNotFoundError(file=config_dir)
+    files = []
+    for name in sorted(os.listdir(config_dir)):
+        path = os.path.join(config_dir, name)
+        if os.path.isfile(path) and name.endswith(tuple(suffixes)):
+            files.append(path)
+    return files
+
+
+def find_config_files(project, suffixes=CONFIG_SUFFIXES):
+    """
+    search the standard locations for the config of a project.
+    The config file is the first of <project>.ini/.yaml/.conf found in the
+    current directory, ~/.<project>/, ~/, /etc/<project>/ and /etc/.
+    Every existing <project>.conf.d directory of these locations is a
+    drop-in directory, the ones of the current directory applied last.
+    :param project: the name of the project
+    :param suffixes: the suffixes of the config file, in order of preference
+    :return: the config file or None, the list of drop-in directories
+    """
+    locations = [os.getcwd(), os.path.expanduser('~/.%s' % project), os.path.expanduser('~'),
+                 '/etc/%s' % project, '/etc']
+    config_file = None
+    for location in locations:
+        for suffix in suffixes:
+            path = os.path.join(location, project + suffix)
+            if os.path.isfile(path):
+                config_file = path
+                break
+        if config_file is not None:
+            break
+    config_dirs = []
+    for location in reversed(locations):
+        path = os.path.join(location, project + '.conf.d')
+        if os.path.isdir(path) and path not in config_dirs:
+            config_dirs.append(path)
+    return config_file, config_dirs
+
+
+def _section_key(section):
+    return section.replace(" ", "").upper()
+
+
+def parse_ini_stream(stream, groups=None, source='<stream>'):
+    """
+    parse ini/conf lines in one pass.
+    The DEFAULT section is merged into every section like configparser does,
+    keys are lower cased and indented lines continue the previous value.
+    `%` interpolation of configparser is not supported.
+    :param stream: an iterable of lines, like a file object
+    :param groups: if given, only the sections whose upper cased name is in
+                   groups are kept, the lines of other sections are skipped
+    :param source: the name of the stream in error messages
+    :return: {section: {key: value}}
+    """
+    config_map = {}
+    defaults = {}
+    current = None  # the dict of the section being read, None to skip it
+    skipping = False
+    key = None
+    for number, line in enumerate(stream, 1):
+        if line[:1] == '[':
+            end = line.find(']')
+            if end < 0:
+                raise exceptions.ConfigFileFormatError(file=source, line=number, text=line.strip())
+            section = line[1:end].strip()
+            key = None
+            if section == 'DEFAULT':
+                current, skipping = defaults, False
+            elif groups is not None and _section_key(section) not in groups:
+                current, skipping = None, True
+            else:
+                current, skipping = config_map.setdefault(section, {}), False
+            continue
+        if skipping:
+            continue
+        stripped = line.strip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        if line[0] in ' \t' and key is not None:
+            current[key] = current[key] + '\n' + stripped if current[key] else stripped
+            continue
+        if current is None:
+            raise exceptions.ConfigFileFormatError(file=source, line=number, text=stripped)
+        equal, colon = stripped.find('='), stripped.find(':')
+        delimiter = min(i for i in (equal, colon, len(stripped)) if i >= 0)
+        if delimiter == len(stripped):
+            raise exceptions.ConfigFileFormatError(file=source, line=number, text=stripped)
+        key = stripped[:delimiter].strip().lower()
+        current[key] = stripped[delimiter + 1:].strip()
+
+    if defaults:
+        for section, opts in config_map.items():
+            config_map[section] = dict(defaults, **opts)
+    return config_map
+
+
+def load_ini_stream(config_file, groups=None):
+    """
+    load an ini or conf file line by line, see `parse_ini_stream`
+    :param config_file: the path of config file
+    :param groups: the upper cased names of the sections to keep, None for all
+    :return: {section: {key: value}}
+    """
     if not os.path.exists(config_file):
         raise exceptions.ConfigFileNotFoundError(file=config_file)
-    with open(config_file, 'r', encoding='utf-8') as ymlfile:
-        cfgs = yaml.load_all(ymlfile, Loader=yaml.SafeLoader)
-        for cfg in cfgs:
-            config.append(cfg)
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return parse_ini_stream(f, groups=groups, source=config_file)
+
+
+def _yaml_loader():
+    import yaml
+    # libyaml is much faster than the pure python loader when available
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
-    if len(config) > 1:
-        raise exceptions.MultiGroupNotSupport
-    return config[0] if config else {}
+def iter_yaml_documents(stream, loader=None):
+    """
+    parse the documents of a yaml stream one by one
+    :param stream: a file object or a string
+    :param loader: the yaml loader class, default is the fastest safe loader
+    :return: a generator of documents
+    """
+    import yaml
+    for document in yaml.load_all(stream, Loader=loader or _yaml_loader()):
+        if document is None:
+            continue
+        if not isinstance(document, dict):
+            raise exceptions.SectionsFormatError()
+        yield document
+
+
+def _options(opts):
+    """
+    :return: the options of a group as a mapping, None for a value which is
+             not a group, like `version: 1` at the top of a yaml file
+    """
+    if isinstance(opts, Mapping):
+        return opts
+    if isinstance(opts, (list, tuple)):
+        try:
+            return dict(opts)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def merge_config_map(config_map, overlay, groups=None):
+    """
+    merge overlay into config_map, the options of a group in overlay
+    override the ones of config_map. Groups are matched like the registered
+    groups, [info] of overlay is merged into [INFO] of config_map and keeps
+    its name. Top level values which are not groups are kept as they are.
+    :param groups: if given, only merge the groups whose upper cased name is in groups
+    :return: config_map
+    """
+    names = {_section_key(group): group for group in config_map if isinstance(group, str)}
+    for group, opts in overlay.items():
+        key = _section_key(group) if isinstance(group, str) else None
+        if groups is not None and key not in groups:
+            continue
+        options = _options(opts)
+        if options is None:
+            config_map[group] = opts
+            continue
+        group = names.setdefault(key, group) if key is not None else group
+        if isinstance(config_map.get(group), dict):
+            config_map[group].update(options)
+        else:
+            config_map[group] = dict(options)
+    return config_map
+
+
+def load_yaml_config(config_file, groups=None, loader=None):
+    """
+    load a yaml file, every document of the file is merged over the
+    previous ones, so a big file can be split in documents.
+    Documents are parsed one at a time while merging.
+    :param config_file: the path of config file
+    :param groups: the upper cased names of the groups to keep, None for all
+    :param loader: the yaml loader class, default is the fastest safe loader
+    :return: {group: {key: value}}
+    """
+    config_map = {}
+    if not os.path.exists(config_file):
+        raise exceptions.ConfigFileNotFoundError(file=config_file)
+    with open(config_file, 'r', encoding='utf-8') as ymlfile:
+        for document in iter_yaml_documents(ymlfile, loader=loader):
+            merge_config_map(config_map, document, groups=groups)
+    return config_map
 
 
 def load_conf_config(config_file):
     return load_ini_cofing(config_file)
+
+
+def _file_digest(config_file):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(config_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(config_file, key, cache_dir):
+    import hashlib
+    key = "%s:%s" % (os.path.realpath(config_file), key)
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.cache')
+
+
+def _read_cache(cache_file):
+    import pickle
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # missing or corrupted cache, it will be rebuilt
+        return None
+
+
+def _write_cache(cache_file, entry):
+    import pickle
+    # the rename is atomic, concurrent readers see the old or the new cache
+    _write_atomic(cache_file, [pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)], mode=0o600)
+
+
+def load_cached_config(config_file, loader, cache_dir, key=None):
+    """
+    load the config map with loader, reusing the map parsed by a previous
+    process when the file did not change.
+    The cache is keyed by the path, mtime, size and sha256 of the file.
+    It is pickled, so cache_dir should only be writable by trusted users.
+    :param config_file: the path of config file
+    :param loader: the loader function, like load_yaml_config
+    :param cache_dir: the directory to store the cache in
+    :param key: tells apart loaders giving different maps for the same file,
+                default is the name of loader
+    :return: the config map
+    """
+    if not os.path.exists(config_file):
+        raise exceptions.ConfigFileNotFoundError(file=config_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = _cache_path(config_file, key or loader.__name__, cache_dir)
+
+    stat = os.stat(config_file)
+    entry = _read_cache(cache_file)
+    if entry is not None and entry.get('mtime') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+        if entry.get('digest') == _file_digest(config_file):
+            return entry['config_map']
+
+    digest = _file_digest(config_file)
+    config_map = loader(config_file)
+    after = os.stat(config_file)
+    if (after.st_mtime_ns, after.st_size) != (stat.st_mtime_ns, stat.st_size):
+        # the file changed while we parsed it, do not cache a mixed result
+        return config_map
+    _write_cache(cache_file, {
+        'path': os.path.realpath(config_file),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'digest': digest,
+        'config_map': config_map,
+    })
+    return config_map
+
+
+def _write_atomic(path, chunks, mode=0o644):
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def dump_compiled_config(values):
+    """
+    encode converted values into the compiled binary format.
+    The layout is a header, a marshaled index {group: {opt: (offset, length, type)}}
+    and the marshaled values, so a reader only decodes the values it uses.
+    :param values: {group: {opt: (type name, converted value)}}
+    :return: the list of chunks of the compiled file
+    """
+    index = {}
+    chunks = []
+    offset = 0
+    for group in sorted(values):
+        entries = index[group] = {}
+        for opt_name in sorted(values[group]):
+            type_name, value = values[group][opt_name]
+            data = marshal.dumps(value)
+            entries[opt_name] = (offset, len(data), type_name)
+            chunks.append(data)
+            offset += len(data)
+    index_data = marshal.dumps(index)
+    header = _COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, sys.version_info[0], sys.version_info[1],
+                                   len(index_data))
+    return [header, index_data] + chunks
+
+
+def write_compiled_config(output, values):
+    _write_atomic(output, dump_compiled_config(values))
+
+
+class CompiledValue(object):
+    """a value of a compiled config left encoded, `load` decodes it"""
+    __slots__ = ('_buffer', '_start', '_length')
+
+    def __init__(self, buffer, start, length):
+        self._buffer = buffer
+        self._start = start
+        self._length = length
+
+    def load(self):
+        return marshal.loads(self._buffer[self._start:self._start + self._length])
+
+
+class CompiledGroup(Mapping):
+    """A group of a compiled config, values are decoded on first access"""
+
+    def __init__(self, buffer, data_start, index):
+        self._buffer = buffer
+        self._data_start = data_start
+        self._index = index
+        self._values = {}
+
+    def __getitem__(self, opt):
+        if opt in self._values:
+            return self._values[opt]
+        offset, length, _ = self._index[opt]
+        start = self._data_start + offset
+        value = marshal.loads(self._buffer[start:start + length])
+        self._values[opt] = value
+        return value
+
+    def ref(self, opt) -> CompiledValue:
+        """the value of opt without decoding it, see Opt.set_current"""
+        offset, length, _ = self._index[opt]
+        return CompiledValue(self._buffer, self._data_start + offset, length)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def type_of(self, opt):
+        return self._index[opt][2]
+
+
+class CompiledConfigMap(Mapping):
+    """The config map of a compiled config file, see `dump_compiled_config`"""
+
+    def __init__(self, buffer, source=None):
+        magic, version, major, minor, index_length = _COMPILED_HEADER.unpack_from(buffer, 0)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION:
+            raise exceptions.NoSupportType("compiled config %s" % source)
+        if (major, minor) != sys.version_info[:2]:
+            raise exceptions.NoSupportType("compiled config %s of python %d.%d, compile it again"
+                                           % (source, major, minor))
+        self._buffer = buffer
+        index_start = _COMPILED_HEADER.size
+        self._data_start = index_start + index_length
+        self._index = marshal.loads(buffer[index_start:self._data_start])
+        self._groups = {}
+
+    def __getitem__(self, group):
+        if group not in self._groups:
+            self._groups[group] = CompiledGroup(self._buffer, self._data_start, self._index[group])
+        return self._groups[group]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def load_compiled_config(config_file):
+    """
+    memory-map a compiled config file, several processes loading the same
+    file share its pages
+    :param config_file: the path of the compiled file
+    :return: an object of CompiledConfigMap
+    """
+    if not os.path.exists(config_file):
+        raise exceptions.ConfigFileNotFoundError(file=config_file)
+    with open(config_file, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return CompiledConfigMap(buffer, source=config_file)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author  : lex(luohai2233@163.com)
+
+The module to watch config files and trigger a reload when they change.
+inotify is used on Linux, other platforms fall back to mtime/size polling.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Iterable
+
+LOG = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+               IN_MOVED_TO | IN_CREATE | IN_DELETE)
+_EVENT = struct.Struct('iIII')
+
+
+def _file_state(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _dir_state(path: str):
+    try:
+        names = sorted(os.listdir(path))
+    except OSError:
+        return None
+    return tuple((name, _file_state(os.path.join(path, name))) for name in names)
+
+
+def _load_inotify():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ConfigWatcher(threading.Thread):
+    """
+    Watch a set of config files and directories and call `callback` once
+    they have been quiet for `debounce` seconds, so an editor writing a
+    file in several steps only triggers one reload. Any file added, changed
+    or removed in one of the directories is a change.
+    """
+
+    def __init__(self, paths: Iterable[str], callback: Callable[[], None],
+                 interval: float = 1.0, debounce: float = 0.2, use_inotify: bool = True,
+                 directories: Iterable[str] = ()):
+        super(ConfigWatcher, self).__init__(name='oocfg-watcher', daemon=True)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self._stop_event = threading.Event()
+        self.directories = [os.path.abspath(path) for path in directories]
+        self._states = {path: _file_state(path) for path in self.paths}
+        self._states.update({path: _dir_state(path) for path in self.directories})
+        self._deadline = None
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def _changed(self):
+        changed = False
+        for path in self.paths + self.directories:
+            state = _dir_state(path) if path in self.directories else _file_state(path)
+            if state != self._states[path]:
+                self._states[path] = state
+                changed = True
+        return changed
+
+    def _mark_changed(self):
+        self._deadline = time.monotonic() + self.debounce
+
+    def _fire_if_due(self):
+        if self._deadline is None or time.monotonic() < self._deadline:
+            return
+        self._deadline = None
+        try:
+            self.callback()
+        except Exception:
+            # keep the old config and keep watching
+            LOG.exception("Failed to reload config files %s", self.paths)
+
+    def _timeout(self):
+        if self._deadline is None:
+            return self.interval
+        return max(0.0, min(self.interval, self._deadline - time.monotonic()))
+
+    def run(self):
+        libc = _load_inotify() if self.use_inotify else None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC) if libc is not None else -1
+        if fd < 0:
+            self._poll()
+            return
+        try:
+            self._watch_inotify(libc, fd)
+        finally:
+            os.close(fd)
+
+    def _poll(self):
+        while not self._stop_event.is_set():
+            if self._changed():
+                self._mark_changed()
+            self._fire_if_due()
+            self._stop_event.wait(self._timeout())
+
+    def _watch_inotify(self, libc, fd):
+        # watch the parent directories, editors often replace the file by a rename
+        names = {}  # {watch descriptor: names of the files to watch, None for all}
+        parents = {}
+        for path in self.paths:
+            parents.setdefault(os.path.dirname(path), set()).add(os.path.basename(path).encode())
+        for directory in self.directories:
+            parents[directory] = None
+        for directory, files in parents.items():
+            wd = libc.inotify_add_watch(fd, directory.encode(), _WATCH_MASK)
+            if wd < 0:
+                LOG.warning("inotify can not watch %s, fall back to polling", directory)
+                self._poll()
+                return
+            names[wd] = files
+
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([fd], [], [], self._timeout())
+            if readable and self._read_events(fd, names):
+                self._mark_changed()
+            self._fire_if_due()
+
+    @staticmethod
+    def _read_events(fd, names) -> bool:
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        hit = False
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            files = names.get(wd, ())
+            if files is None or name in files:
+                hit = True
+        return hit
@@ -4,14 +4,23 @@
 """
 @Author  : lex(luohai2233@163.com)
 """
+import argparse
+import asyncio
+import io
 import os
+import subprocess
+import sys
+import threading
+import time
 
 import pytest
 
 from src import cfg
+from src.cfg import Config
 from src.config import options
 
 from src.config import exceptions
+from src.config import loaders
 
 
 def test_str_opt():
@@ -198,3 +207,816 @@ def test_conf_config():
     assert cfg.CONF.INFO.height == 1.77
     assert cfg.CONF.INFO.books == ['c++', 'python', 'golang']
     assert cfg.CONF.INFO.age == 22
+
+
+def test_snapshot():
+    conf = Config()
+    conf.register_group("info", [
+        options.StrOpt('name', default='Joe', helper='name info'),
+        options.ListOpt('books', default=['a'], helper='books info'),
+    ])
+    snapshot = conf.snapshot()
+    assert snapshot.INFO.name == 'Joe'
+    assert snapshot['info']['books'] == ('a',)
+    assert snapshot.info is snapshot.INFO
+    with pytest.raises(AttributeError):
+        snapshot.INFO.name = 'Mike'
+    with pytest.raises(exceptions.NoSuchOpt):
+        snapshot.INFO['age']
+
+    conf.CONF.INFO.set_opt_value('name', 'Mike')
+    assert snapshot.INFO.name == 'Joe'
+    assert conf.snapshot().INFO.name == 'Mike'
+
+
+def _info_config(tmp_path, content, name='config.ini'):
+    config_file = tmp_path / name
+    config_file.write_text(content)
+    conf = Config()
+    conf.register_group("info", [
+        options.StrOpt('name', default='Joe', helper='name info'),
+        options.IntOpt('age', default=18, helper='age info'),
+    ])
+    return conf, str(config_file)
+
+
+def test_reload(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.startup(config_file=file)
+    old = conf.CONF
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Lily\n")
+    conf.reload()
+    assert conf.CONF is not old
+    assert conf.CONF.INFO.name == 'Lily'
+    assert conf.CONF.INFO.age == 18
+    assert old.INFO.name == 'Mike'
+
+    with open(file, 'w') as f:
+        f.write("[info]\nage=abc\n")
+    with pytest.raises(ValueError):
+        conf.reload()
+    assert conf.CONF.INFO.name == 'Lily'
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watch(tmp_path, use_inotify):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    conf.startup(config_file=file)
+    conf.watch(interval=0.05, debounce=0.05, use_inotify=use_inotify)
+    try:
+        time.sleep(0.1)
+        with open(file, 'w') as f:
+            f.write("[info]\nname=Lily\n")
+        deadline = time.time() + 5
+        while conf.CONF.INFO.name != 'Lily' and time.time() < deadline:
+            time.sleep(0.02)
+        assert conf.CONF.INFO.name == 'Lily'
+    finally:
+        conf.stop_watch()
+
+
+def test_reload_on_change(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.register_group("education", [options.IntOpt('grade', default=6, helper='the class grade')])
+    conf.startup(config_file=file)
+    events = []
+    conf.on_change("INFO.name", lambda *args: events.append(args))
+    conf.on_change("info.age", lambda *args: events.append(args))
+
+    old = conf.CONF
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Mike\nage=21\n")
+    conf.reload()
+    assert events == [("INFO.age", 20, 21)]
+    assert conf.CONF.INFO._opts['name'] is old.INFO._opts['name']
+    assert conf.CONF.EDUCATION._opts['grade'] is old.EDUCATION._opts['grade']
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Mike\nage=18\n")
+    conf.reload()
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Mike\n")
+    conf.reload()
+    assert events == [("INFO.age", 20, 21), ("INFO.age", 21, 18)]
+
+
+def test_on_change_after_stop_watch(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    conf.startup(config_file=file)
+    events = []
+    conf.on_change("INFO.name", lambda *args: events.append(args))
+    conf.watch(interval=0.05, debounce=0.05, use_inotify=False)
+    conf.stop_watch()
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Lily\n")
+    conf.reload()
+    assert events == [("INFO.name", 'Mike', 'Lily')]
+
+
+def test_cached_config(tmp_path):
+    from src.config import utils
+    calls = []
+
+    def loader(config_file):
+        calls.append(config_file)
+        return utils.load_ini_cofing(config_file)
+
+    cache_dir = str(tmp_path / 'cache')
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    first = utils.load_cached_config(file, loader, cache_dir)
+    assert utils.load_cached_config(file, loader, cache_dir) == first
+    assert len(calls) == 1
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Lily\n")
+    assert dict(utils.load_cached_config(file, loader, cache_dir)['info']) == {'name': 'Lily'}
+    assert len(calls) == 2
+
+    conf.startup(config_file=file, cache_dir=cache_dir)
+    assert conf.CONF.INFO.name == 'Lily'
+
+
+def test_compiled_config(tmp_path):
+    from src.config import utils
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n[other]\nkey=value\n")
+    output = conf.compile(file)
+    assert output.endswith('.oocc')
+
+    compiled = utils.load_compiled_config(output)
+    assert list(compiled) == ['INFO']
+    assert compiled['INFO']['age'] == 20
+
+    conf.startup(config_file=output)
+    assert type(conf.CONF.INFO._opts['age']._raw) is utils.CompiledValue
+    assert conf.CONF.INFO.name == 'Mike'
+    assert conf.CONF.INFO.age == 20
+    assert conf.CONF.INFO._opts['age'].current == 20
+
+    with open(output, 'r+b') as f:
+        f.seek(6)
+        f.write(bytes([2, 7]))
+    with pytest.raises(exceptions.NoSupportType):
+        utils.load_compiled_config(output)
+
+    with open(file, 'w') as f:
+        f.write("[info]\nage=abc\n")
+    with pytest.raises(ValueError):
+        conf.compile(file)
+
+
+def test_shared_config(tmp_path, monkeypatch):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    conf.startup(config_file=file)
+    name = conf.publish_shared('oocfg_test_%d' % os.getpid())
+    try:
+        worker = Config()
+        worker.attach_shared(name)
+        assert worker.CONF.INFO.name == 'Mike'
+        assert worker.CONF.info['age'] == 18
+        generation = worker.CONF.generation
+
+        with open(file, 'w') as f:
+            f.write("[info]\nname=Lily\n")
+        conf.reload()
+        assert worker.CONF.INFO.name == 'Lily'
+        assert worker.CONF.generation > generation
+
+        # a master dying while it publishes leaves an odd generation
+        from src.config import shared
+        monkeypatch.setattr(shared, 'PUBLISH_TIMEOUT', 0.05)
+        control = conf._publisher._control.buf
+        shared._GENERATION.pack_into(control, 0, conf._publisher.generation + 1)
+        with pytest.raises(exceptions.SharedConfigBusyError):
+            worker.CONF.INFO
+        shared._GENERATION.pack_into(control, 0, conf._publisher.generation)
+        worker.CONF.close()
+    finally:
+        conf.close_shared()
+
+
+def test_lazy_startup(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=abc\n")
+    conf.startup(config_file=file, lazy=True)
+    assert conf.CONF.INFO._opts['name'].current is None
+    assert conf.CONF.INFO.name == 'Mike'
+    assert conf.CONF.INFO._opts['name'].current == 'Mike'
+    with pytest.raises(ValueError):
+        conf.validate_all()
+    with pytest.raises(ValueError):
+        conf.CONF.INFO.age
+
+    events = []
+    conf.on_change('INFO.age', lambda *args: events.append(args))
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Mike\nage=20\n")
+    conf.reload()
+    assert conf.CONF.INFO.age == 20
+    assert events == [('INFO.age', 'abc', 20)]
+
+
+def test_ini_stream():
+    from src.config import utils
+    stream = io.StringIO(
+        "[DEFAULT]\n"
+        "debug = true\n"
+        "[info]\n"
+        "; comment\n"
+        "Name: Mike\n"
+        "books = c++,\n"
+        "  python\n"
+        "[other]\n"
+        "key = value\n"
+    )
+    config_map = utils.parse_ini_stream(stream, groups={'INFO'})
+    assert config_map == {'info': {'debug': 'true', 'name': 'Mike', 'books': 'c++,\npython'}}
+
+    with pytest.raises(exceptions.ConfigFileFormatError):
+        utils.parse_ini_stream(io.StringIO("[info]\nname\n"))
+
+    file = os.path.join(os.path.dirname(__file__), 'config.ini')
+    assert utils.load_ini_stream(file) == {
+        section: dict(opts) for section, opts in utils.load_ini_cofing(file).items()}
+
+
+def test_yaml_documents(tmp_path):
+    import yaml
+    from src.config import utils
+    file = tmp_path / 'config.yaml'
+    file.write_text("info:\n  name: Mike\n  age: 20\nother:\n  key: 1\n---\ninfo:\n  age: 21\n---\n")
+    for loader in (yaml.SafeLoader, None):
+        assert utils.load_yaml_config(str(file), loader=loader) == {
+            'info': {'name': 'Mike', 'age': 21}, 'other': {'key': 1}}
+    assert utils.load_yaml_config(str(file), groups={'INFO'}) == {'info': {'name': 'Mike', 'age': 21}}
+
+    file.write_text("version: 1\ninfo:\n  name: Mike\n")
+    assert utils.load_yaml_config(str(file)) == {'version': 1, 'info': {'name': 'Mike'}}
+    conf = Config()
+    conf.register_group("info", [options.StrOpt('name', default='Joe', helper='name info')])
+    conf.startup(config_file=str(file))
+    file.write_text("version: 2\ninfo:\n  name: Lily\n")
+    conf.reload()
+    assert conf.CONF.INFO.name == 'Lily'
+
+    file.write_text("- a\n- b\n")
+    with pytest.raises(exceptions.SectionsFormatError):
+        utils.load_yaml_config(str(file))
+
+
+def test_config_dirs(tmp_path, monkeypatch):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf_d = tmp_path / 'conf.d'
+    conf_d.mkdir()
+    (conf_d / '20-name.yaml').write_text("info:\n  name: Lily\n")
+    (conf_d / '10-name.ini').write_text("[info]\nname=Lucy\nage=30\n")
+    (conf_d / 'README').write_text("not a config file")
+    conf.startup(config_file=file, config_dirs=[str(conf_d)])
+    assert conf.CONF.INFO.name == 'Lily'
+    assert conf.CONF.INFO.age == 30
+
+    (conf_d / '10-name.ini').write_text("[INFO]\nage=30\n")
+    (conf_d / '30-age.ini').write_text("[info]\nage=40\n")
+    conf.reload()
+    assert conf.CONF.INFO.age == 40
+    assert list(conf.config_map) == ['info']
+    conf.CONF.set_config_file_value({'info': {'age': 50}, 'INFO': {'age': 60}})
+    assert conf.CONF.INFO.age == 60
+
+    monkeypatch.chdir(tmp_path)
+    os.rename(file, str(tmp_path / 'myapp.ini'))
+    os.rename(str(conf_d), str(tmp_path / 'myapp.conf.d'))
+    conf, _ = _info_config(tmp_path, "")
+    conf.startup(auto_find=True, project='myapp')
+    assert conf.config_file == str(tmp_path / 'myapp.ini')
+    assert conf.CONF.INFO.name == 'Lily'
+
+
+def test_opt_identity():
+    opt = options.StrOpt('name', default='Joe', helper='name info', choices=['Joe', 'Mike'])
+    assert not hasattr(opt, '__dict__')
+    same = options.StrOpt('name', default='Joe', helper='name info', choices=['Joe', 'Mike'], current='Mike')
+    assert opt == same and hash(opt) == hash(same)
+    assert opt != options.StrOpt('name', default='Mike', helper='name info', choices=['Joe', 'Mike'])
+
+    group = options.GroupOpt('info')
+    group.register_opts([opt, same])
+    with pytest.raises(exceptions.DuplicateOptError):
+        group.register_opts([options.IntOpt('name', default=1)])
+
+
+def test_overlay(tmp_path):
+    base, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    base.register_group("education", [options.IntOpt('grade', default=6, helper='the class grade')])
+    base.startup(config_file=file)
+
+    tenant = base.overlay()
+    other = base.overlay()
+    tenant.CONF.set_config_file_value({'info': {'age': '30'}})
+    tenant.CONF.set_opt_value('education', 'grade', 2)
+    assert tenant.CONF.INFO.age == 30
+    assert tenant.CONF.INFO.name == 'Mike'
+    assert tenant.CONF.EDUCATION.grade == 2
+    assert base.CONF.INFO.age == 18
+    assert base.CONF.EDUCATION.grade == 6
+    assert other.CONF.INFO.age == 18
+    assert tenant.CONF.INFO._opts['name'] is base.CONF.INFO._opts['name']
+
+    base.CONF.set_opt_value('info', 'name', 'Lily')
+    assert base.CONF.INFO.name == 'Lily'
+    assert tenant.CONF.INFO.name == 'Mike'
+    with pytest.raises(exceptions.NoSuchOpt):
+        tenant.CONF.set_opt_value('info', 'height', 1)
+
+    tenant.CONF.INFO.set_opt_value('name', 'Tenant')
+    assert tenant.CONF.INFO.name == 'Tenant'
+    assert base.CONF.INFO.name == 'Lily'
+    assert other.CONF.INFO.name == 'Mike'
+
+    group = base.CONF.INFO
+    group.set_opt_value('name', 'b')
+    later = base.overlay()
+    group.set_opt_value('name', 'c')
+    assert (base.CONF.INFO.name, later.CONF.INFO.name) == ('c', 'b')
+
+
+def test_instrumentation(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    conf.startup(config_file=file)
+    conf.enable_instrumentation()
+    for _ in range(3):
+        conf.CONF.INFO.name
+    report = conf.access_report()
+    assert report['reads'] == 3
+    assert report['hot'][0]['name'] == 'INFO.name'
+    assert report['unused'] == ['INFO.age']
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Lily\n")
+    conf.reload()
+    assert conf.CONF.INFO.name == 'Lily'
+    assert conf.access_report()['reads'] == 4
+
+    conf.disable_instrumentation()
+    assert type(conf.CONF.INFO) is options.GroupOpt
+    assert conf.access_report() is None
+    conf.rollback(1)
+    conf.rollback(2)
+    assert type(conf.CONF.INFO) is options.GroupOpt
+
+    stats = conf.enable_instrumentation(sample=2)
+    for _ in range(4):
+        conf.CONF.INFO.age
+    assert stats.counts[('INFO', 'age')] == 4
+
+    with pytest.raises(exceptions.DumpCallbackMissingError):
+        conf.enable_instrumentation(dump_interval=5)
+    dumps = []
+
+    def dump(report):
+        dumps.append(report)
+        raise RuntimeError('dump failed')
+    conf.enable_instrumentation(dump_interval=0.01, dump=dump)
+    deadline = time.time() + 5
+    while len(dumps) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    conf.disable_instrumentation()
+    assert len(dumps) >= 2
+
+
+def test_interpolation(tmp_path, monkeypatch):
+    monkeypatch.setenv('OOCFG_TEST_HOST', 'example.com')
+    conf, file = _info_config(tmp_path, "[info]\nname=${SERVER.host}:${SERVER.port}\nage=${SERVER.port}\n")
+    conf.register_group("server", [
+        options.StrOpt('host', default='${env:OOCFG_TEST_HOST}'),
+        options.IntOpt('port', default='${env:OOCFG_TEST_PORT:-8080}'),
+        options.StrOpt('url', default='http://${host}:${port}/$${path}'),
+        options.ListOpt('hosts', default='${host}'),
+        options.StrOpt('price', default='cost$$5'),
+        options.StrOpt('total', default='cost$$5-${port}'),
+        options.StrOpt('literal', default='\\${path}'),
+    ])
+    conf.startup(config_file=file)
+    assert conf.CONF.SERVER.host == 'example.com'
+    # the escapes are only unescaped in templates
+    assert conf.CONF.SERVER.price == 'cost$$5'
+    assert conf.CONF.SERVER.total == 'cost$5-8080'
+    assert conf.CONF.SERVER.literal == '\\${path}'
+    assert conf.CONF.SERVER.port == 8080
+    assert conf.CONF.SERVER.url == 'http://example.com:8080/${path}'
+    assert conf.CONF.SERVER.hosts == ['example.com']
+    assert conf.CONF.INFO.name == 'example.com:8080'
+    assert conf.CONF.INFO.age == 8080
+
+    events = []
+    conf.on_change('INFO.name', lambda *args: events.append(args))
+    old = conf.CONF
+    with open(file, 'w') as f:
+        f.write("[info]\nname=${SERVER.host}:${SERVER.port}\nage=${SERVER.port}\n[server]\nport=9090\n")
+    conf.reload()
+    assert conf.CONF.SERVER.url == 'http://example.com:9090/${path}'
+    assert conf.CONF.INFO.age == 9090
+    assert events == [('INFO.name', 'example.com:8080', 'example.com:9090')]
+    assert conf.CONF.SERVER._opts['host'] is old.SERVER._opts['host']
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=${INFO.age}\nage=${name}\n")
+    with pytest.raises(exceptions.InterpolationCycleError):
+        conf.reload()
+    assert conf.CONF.INFO.age == 9090
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=${SERVER.host}:${SERVER.port}\nage=${SERVER.port}\n[server]\nport=7070\n")
+    conf.reload()
+    assert conf.CONF.INFO.name == 'example.com:7070'
+
+
+def test_validation_errors(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=old\n[server]\nport=http\ndebug=maybe\n")
+    conf.register_group("server", [
+        options.IntOpt('port', default=80),
+        options.BoolOpt('debug', default=False),
+    ])
+    with pytest.raises(exceptions.ConfigValidationError) as e:
+        conf.startup(config_file=file)
+    assert sorted(name for name, _ in e.value.errors) == ['INFO.age', 'SERVER.debug', 'SERVER.port']
+    assert isinstance(e.value, ValueError)
+
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.startup(config_file=file)
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Tom\nage=old\n")
+    with pytest.raises(exceptions.ConfigValidationError):
+        conf.reload()
+    assert conf.CONF.INFO.name == 'Mike'
+
+
+def test_overrides(tmp_path, monkeypatch):
+    monkeypatch.setenv('OOCFG_INFO__NAME', 'Env')
+    monkeypatch.setenv('OOCFG_INFO__AGE', '30')
+    monkeypatch.setenv('OOCFG_INFO__UNKNOWN', 'x')
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.register_group("server", [options.BoolOpt('debug', default=False, helper='debug mode')])
+    conf.startup(config_file=file, env_prefix='OOCFG_', argv=['run', '--info-age=40', '--server-debug'])
+    assert conf.CONF.INFO.name == 'Env'
+    assert conf.CONF.INFO.age == 40
+    assert conf.CONF.SERVER.debug is True
+
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Tom\nage=old\n")
+    conf.reload()
+    assert conf.CONF.INFO.name == 'Env'
+    assert conf.CONF.INFO.age == 40
+
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\n")
+    parser = argparse.ArgumentParser()
+    conf.add_arguments(parser)
+    assert 'name info' in parser.format_help()
+    conf.startup(config_file=file, argv=parser.parse_args(['--info-name', 'Cli']))
+    assert conf.CONF.INFO.name == 'Cli'
+    assert conf.CONF.INFO.age == 18
+
+
+def test_async_reload(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+
+    async def main():
+        await conf.astartup(config_file=file)
+        assert conf.CONF.INFO.name == 'Mike'
+        events = conf.changes(names=['info.name'])
+        with open(file, 'w') as f:
+            f.write("[info]\nname=Tom\nage=21\n")
+        await conf.areload()
+        event = await asyncio.wait_for(events.__anext__(), 5)
+        await events.aclose()
+        async for _ in events:
+            raise AssertionError('closed')
+        return event
+
+    assert asyncio.run(main()) == ('INFO.name', 'Mike', 'Tom')
+    assert conf._subscribers == []
+
+
+def test_concurrent_readers(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=v0\nage=0\n")
+    conf.startup(config_file=file)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            for _ in range(100):
+                current = conf.CONF
+                name, age = current.INFO.name, current.INFO.age
+                if name != 'v%d' % age:
+                    errors.append((name, age))
+            # let the reload thread run
+            time.sleep(0)
+
+    readers = [threading.Thread(target=read) for _ in range(16)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(1, 100):
+            with open(file, 'w') as f:
+                f.write("[info]\nname=v%d\nage=%d\n" % (i, i))
+            conf.reload()
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert errors == []
+    assert conf.CONF.INFO.age == 99
+
+
+def test_generate(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.register_group("server", [options.ListOpt('class', default=['a', 'b'])])
+    module_file = tmp_path / 'settings.py'
+    conf.generate(output=str(module_file))
+    conf.startup(config_file=file)
+
+    namespace = {}
+    exec(compile(module_file.read_text(), str(module_file), 'exec'), namespace)
+    typed = namespace['from_config'](conf)
+    assert (typed.info.name, typed.info.age, typed.server.class_) == ('Mike', 20, ['a', 'b'])
+    assert not hasattr(typed.info, '__dict__')
+    assert namespace['Info'].__annotations__ == {'name': str, 'age': int}
+
+    conf.register_group("mapping", [options.ListOpt('keys', default=['k'])])
+    namespace = {}
+    exec(compile(conf.generate(), '<settings>', 'exec'), namespace)
+    assert namespace['from_config'](conf).mapping.keys == ['k']
+
+    conf.register_group("mapping", [options.StrOpt('x', alias='a-b', default='')])
+    conf.register_group("mapping", [options.StrOpt('y', alias='a_b', default='')])
+    with pytest.raises(exceptions.GeneratedNameConflictError):
+        conf.generate()
+
+
+def test_import_time():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         "import src.cfg; assert 'cfg' not in vars(src.cfg); from src.cfg import cfg; assert cfg is src.cfg.cfg"],
+        cwd=root, capture_output=True, text=True, check=True)
+    imported = {line.split('|')[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+    assert 'src.cfg' in imported
+    for module in ('yaml', 'configparser', 'asyncio', 'argparse', 'multiprocessing', 'concurrent.futures'):
+        assert module not in imported
+
+
+def test_loaders(tmp_path):
+    expected = {'info': {'name': 'Mike', 'age': 20}}
+    sources = {
+        'config.json': '{"info": {"name": "Mike", "age": 20}, "other": {"x": 1}}',
+        'config.toml': '[info]\nname = "Mike"\nage = 20\n[other]\nx = 1\n',
+        'config.yml': 'info:\n  name: Mike\n  age: 20\n',
+    }
+    for name, content in sources.items():
+        (tmp_path / name).write_text(content)
+        assert loaders.load(str(tmp_path / name), groups={'INFO'}) == expected
+
+    # top level values which are not groups
+    assert loaders.load(b'{"version": 1, "info": {"name": "Mike", "age": 20}}') == dict(expected, version=1)
+    (tmp_path / 'versioned.toml').write_text('version = 1\n[info]\nname = "Mike"\nage = 20\n')
+    assert loaders.load(str(tmp_path / 'versioned.toml')) == dict(expected, version=1)
+    conf, _ = _info_config(tmp_path, '')
+    conf.startup(config_file=str(tmp_path / 'versioned.toml'))
+    assert conf.CONF.INFO.age == 20
+
+    assert loaders.detect(b'  {"info": {}}').name == 'json'
+    assert loaders.detect(b'# comment\n[info]\nname=Mike\n').name == 'ini'
+    assert loaders.detect(b'info:\n  name: Mike\n').name == 'yaml'
+    assert loaders.load(io.BytesIO(b'{"info": {"name": "Mike", "age": 20}}')) == expected
+    with pytest.raises(exceptions.NoSupportType):
+        loaders.detect(b'name Mike')
+
+    json_loader = loaders.get_loader('json')
+    loader = loaders.Loader('json', ['.json'], [('missing', _missing_backend)] + json_loader.backends,
+                            sniff=json_loader.sniff)
+    loaders.register(loader)
+    try:
+        conf, _ = _info_config(tmp_path, '')
+        conf.startup(config_file=io.StringIO('{"info": {"name": "Tom", "age": "21"}}'))
+        assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Tom', 21)
+        assert loader.backend in ('orjson', 'json')
+        conf.reload()
+        assert conf.CONF.INFO.name == 'Tom'
+    finally:
+        loaders.register(json_loader)
+
+
+def _missing_backend():
+    raise ImportError('missing')
+
+
+def test_rollback(tmp_path):
+    config_file = tmp_path / 'config.ini'
+    config_file.write_text("[info]\nname=Mike\nage=20\n")
+    conf = Config(history=3)
+    conf.register_group("info", [options.StrOpt('name', default='Joe'), options.IntOpt('age', default=18)])
+    conf.register_group("server", [options.IntOpt('port', default=80)])
+    conf.startup(config_file=str(config_file))
+    assert conf.version == 1
+    first = conf.CONF
+
+    events = []
+    conf.on_change('INFO.name', lambda *args: events.append(args))
+    config_file.write_text("[info]\nname=Bad\nage=20\n")
+    conf.reload()
+    assert (conf.version, conf.CONF.INFO.name) == (2, 'Bad')
+    assert conf.CONF.SERVER._opts['port'] is first.SERVER._opts['port']
+
+    conf.rollback()
+    assert (conf.version, conf.CONF.INFO.name) == (1, 'Mike')
+    assert events == [('INFO.name', 'Mike', 'Bad'), ('INFO.name', 'Bad', 'Mike')]
+    conf.CONF.set_opt_value('info', 'age', 30)
+    conf.rollback(2)
+    conf.rollback(1)
+    assert conf.CONF.INFO.age == 20
+
+    config_file.write_text("[info]\nname=Tom\nage=20\n")
+    conf.reload()
+    conf.reload()
+    assert (conf.version, conf.CONF.INFO.name) == (4, 'Tom')
+    assert conf.versions() == [2, 3, 4]
+    with pytest.raises(exceptions.ConfigVersionNotFoundError):
+        conf.rollback(1)
+
+    conf.CONF.INFO.set_opt_value('name', 'Hacked')
+    assert conf._history[-1].conf._group['INFO']._opts['name'].value == 'Tom'
+    conf.rollback(3)
+    conf.rollback(4)
+    assert conf.CONF.INFO.name == 'Tom'
+
+    # a group taken before a reload which leaves it unchanged
+    stale = conf.CONF.INFO
+    config_file.write_text("[info]\nname=Tom\nage=20\n[server]\nport=81\n")
+    conf.reload()
+    stale.set_opt_value('name', 'stale-write')
+    assert [entry.conf._group['INFO']._opts['name'].value for entry in conf._history] == ['Tom'] * 3
+    conf.rollback(4)
+    assert conf.CONF.INFO.name == 'Tom'
+
+
+def test_override(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.register_group("server", [options.StrOpt('greeting', default='hello-${INFO.name}')])
+    conf.startup(config_file=file)
+    assert type(conf) is Config
+
+    with conf.override(info={'name': 'Canary'}):
+        assert conf.CONF.INFO.name == 'Canary'
+        assert conf.CONF.SERVER.greeting == 'hello-Canary'
+        with conf.override(INFO={'age': '30'}):
+            assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Canary', 30)
+        with open(file, 'w') as f:
+            f.write("[info]\nname=Mike\nage=21\n")
+        conf.reload()
+        assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Canary', 21)
+    assert (conf.CONF.INFO.name, conf.CONF.SERVER.greeting) == ('Mike', 'hello-Mike')
+    with pytest.raises(exceptions.ConfigValidationError):
+        with conf.override(INFO={'age': 'old'}):
+            pass
+
+    seen = {}
+
+    def worker(name):
+        with conf.override(INFO={'name': name}):
+            time.sleep(0.01)
+            seen[name] = conf.CONF.INFO.name
+
+    threads = [threading.Thread(target=worker, args=('t%d' % i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == {'t0': 't0', 't1': 't1', 't2': 't2', 't3': 't3'}
+
+    async def task(name):
+        with conf.override(INFO={'name': name}):
+            await asyncio.sleep(0.01)
+            return conf.CONF.INFO.name
+
+    async def main():
+        return await asyncio.gather(task('a'), task('b'))
+
+    assert asyncio.run(main()) == ['a', 'b']
+    assert conf.CONF.INFO.name == 'Mike'
+
+    class MyConfig(Config):
+        def hello(self):
+            return 'hello %s' % self.CONF.INFO.name
+
+    conf = MyConfig()
+    conf.register_group("info", [options.StrOpt('name', default='Joe')])
+    conf.startup()
+    with conf.override(INFO={'name': 'canary'}):
+        assert conf.hello() == 'hello canary'
+    assert isinstance(conf, MyConfig) and conf.hello() == 'hello Joe'
+
+
+def test_export_and_fingerprint(tmp_path):
+    conf, file = _info_config(tmp_path, "[info]\nname=Mike\nage=20\n")
+    conf.register_group("server", [
+        options.ListOpt('hosts', default=['a', 'b']),
+        options.BoolOpt('debug', default=False),
+        options.FloatOpt('ratio', default=0.5),
+    ])
+    conf.startup(config_file=file)
+    expected = conf.CONF.option_values()
+    assert conf.export(config_format='ini') == \
+        "[INFO]\nage = 20\nname = Mike\n\n[SERVER]\ndebug = false\nhosts = a,b\nratio = 0.5\n"
+    for config_format in ('json', 'yaml', 'ini'):
+        stream = io.StringIO()
+        conf.export(stream, config_format=config_format)
+        assert conf.export(config_format=config_format) == stream.getvalue()
+        other, _ = _info_config(tmp_path, '')
+        other.register_group("server", [
+            options.ListOpt('hosts', default=[]),
+            options.BoolOpt('debug', default=True),
+            options.FloatOpt('ratio', default=1.0),
+        ])
+        other.startup(config_file=io.BytesIO(stream.getvalue().encode()), config_format=config_format)
+        assert other.CONF.option_values() == expected
+        assert other.fingerprint() == conf.fingerprint()
+
+    fingerprint = conf.fingerprint()
+    server = conf.CONF.SERVER
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Tom\nage=20\n")
+    conf.reload()
+    assert conf.fingerprint() != fingerprint
+    assert conf.CONF._group['SERVER']._opts is server._opts
+    assert conf.CONF._group['SERVER']._fingerprint is not None
+    with open(file, 'w') as f:
+        f.write("[info]\nname=Mike\nage=20\n")
+    conf.reload()
+    assert conf.fingerprint() == fingerprint
+
+
+def test_sharded_store(tmp_path, caplog):
+    store = tmp_path / 'central.ini'
+    store.write_text("[DEFAULT]\nage=30\n[other]\nx=1\n[info]\nname=Mike\n[server]\nport=http\n"
+                     "[web]\nurl=${INFO.name}:${SERVER.port}\n")
+    from src.config import sharding
+    from src import cli
+    cli.main(['index', str(store)])
+    assert sharding.read_index(str(store) + sharding.INDEX_SUFFIX)['sections'].keys() == \
+        {'DEFAULT', 'OTHER', 'INFO', 'SERVER', 'WEB'}
+
+    conf, _ = _info_config(tmp_path, '')
+    conf.register_group("server", [options.IntOpt('port', default=80)])
+    conf.register_group("web", [options.StrOpt('url', default='')])
+    conf.startup(store=str(store))
+    assert type(conf.CONF) is sharding.LazyConfigOpts
+    assert conf.CONF._pending.keys() == {'INFO', 'SERVER', 'WEB'}
+    assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Mike', 30)
+    assert conf.CONF._pending.keys() == {'SERVER', 'WEB'}
+    with pytest.raises(exceptions.ConfigValidationError):
+        conf.CONF.SERVER
+    assert conf.CONF.INFO.name == 'Mike'
+
+    store.write_text("[info]\nname=Tom\n[server]\nport=8080\n[web]\nurl=${INFO.name}:${SERVER.port}\n")
+    conf.reload()
+    assert conf.CONF._pending.keys() == {'SERVER', 'WEB'}
+    assert conf.CONF.INFO.name == 'Tom'
+    assert conf.CONF.WEB.url == 'Tom:8080'
+    assert type(conf.CONF) is options.ConfigOpts
+
+    # the templates are interpolated from the values of the store, like an eager startup
+    for kwargs in ({'store': str(store)}, {'config_file': str(store)}):
+        conf, _ = _info_config(tmp_path, '')
+        conf.register_group("server", [options.IntOpt('port', default=80)])
+        conf.register_group("web", [options.StrOpt('url', default='')])
+        conf.register_group("link", [options.StrOpt('home', default='http://${INFO.name}'),
+                                     options.StrOpt('api', default='${WEB.url}/api')])
+        conf.startup(**kwargs)
+        assert (conf.CONF.LINK.home, conf.CONF.LINK.api) == ('http://Tom', 'Tom:8080/api')
+
+    shards = tmp_path / 'shards'
+    shards.mkdir()
+    (shards / 'info.yaml').write_text("info:\n  name: Lily\n")
+    conf, _ = _info_config(tmp_path, '')
+    conf.startup(store=str(shards))
+    assert conf.CONF.INFO.name == 'Lily'
+
+    # the groups loaded on demand belong to the version, a rollback does not read the store
+    store.write_text("[info]\nname=Mike\nage=1\n")
+    conf, _ = _info_config(tmp_path, '')
+    conf.startup(store=str(store))
+    assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Mike', 1)
+    assert conf._history[-1].config_map is not conf.config_map
+    store.write_text("[info]\nname=Tom\nage=2\n")
+    conf.reload()
+    assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Tom', 2)
+    conf.rollback(1)
+    assert (conf.CONF.INFO.name, conf.CONF.INFO.age) == ('Mike', 1)
+
+    # a missing or stale index is only logged once per store
+    caplog.clear()
+    with caplog.at_level('WARNING', logger='src.config.sharding'):
+        indexed = sharding.IndexedFileStore(str(store))
+        indexed.refresh()
+        indexed.refresh()
+    assert len([record for record in caplog.records if 'stale' in record.getMessage()]) == 1